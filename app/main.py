@@ -2,14 +2,40 @@
 # This project is licensed under the Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International License.
 # To view a copy of this license, visit https://creativecommons.org/licenses/by-nc-sa/4.0/
 
+import os
 import requests
 from config import AppConfig
+from constants import DEFAULT_COLLECTION
 from app.src.llm.chat import Chat, ChatConfig, LMStudioClient
+from app.src.llm.answer_cache import SemanticAnswerCache
+from app.src.llm.scheduler import LLMScheduler
+from app.src.llm.session_store import SessionStore
 from app.src.llm.embedding_generator import EmbeddingGenerator
+from app.src.document_processing.document_watcher import (
+    DocumentWatcher, apply_document_changes, find_unindexed_copies, retire_document, scan_documents
+)
+from app.src.document_processing.ingest_queue import IngestQueue, IngestQueueFull, IngestSpool
 from app.src.document_processing.pdf_formatter import PDFFormatter
+from app.src.vector.collection_manager import Collection, LoadedCollection
+from app.src.vector.compaction import CompactionWorker
+from app.src.vector.reembedding import ReembeddingJob
+from app.src.vector.shared_index import WriterLock
 from app.src.vector.vector_manager import VectorManager
 from app.src.utils.logging_manager import LoggingManager
 
+# Held for the life of the process by the worker that won the writer election
+_writer_lock = None
+
+def elect_writer(config: AppConfig) -> bool:
+    """True if this process owns ingestion; always the case with a single worker."""
+    global _writer_lock
+    if config.workers <= 1:
+        return True
+    if _writer_lock is None:
+        _writer_lock = WriterLock(config.shared_index_dir + '.writer.lock')
+        _writer_lock.acquire()
+    return _writer_lock.held
+
 def get_loaded_models(api_url: str) -> list:
     try:
         resp = requests.get(api_url.replace("/chat/completions", "/models"), timeout=10)
@@ -19,81 +45,215 @@ def get_loaded_models(api_url: str) -> list:
     except Exception as e:
         raise RuntimeError(f"Failed to query LM Studio models: {e}")
 
-def initialize_components(config: AppConfig) -> tuple:
-    logging_agent = LoggingManager()
-    try:
-        # Check loaded models
-        models = get_loaded_models(config.completions_url)
-        if not models:
-            logging_agent.log_error("No models loaded in LM Studio. Please load a model and restart.")
-            raise SystemExit("Fatal error: No models loaded in LM Studio.")
-
-        logging_agent.log_info(f"Loaded models: {[m['id'] for m in models]}")
-        logging_agent.log_info("Starting application with config:")
-        logging_agent.log_info(f"Embeddings URL: {config.embeddings_url}")
-        logging_agent.log_info(f"Completions URL: {config.completions_url}")
-        logging_agent.log_info(f"Embedding Model ID: {config.embedding_model_id}")
-        logging_agent.log_info(f"Completion Model ID: {config.completion_model_id}")
-        logging_agent.log_info(f"Documents Directory: {config.documents_directory}\n")
-        
-        if not config.document_paths:
-            logging_agent.log_error(f"No PDF file found in {config.documents_directory}")
-            logging_agent.log_info("Please place your documents in the folder and try again.")
-        logging_agent.log_info(f"Found {len(config.document_paths)} PDF documents\n")
-        
-        embedding_generator = EmbeddingGenerator(
-            url=config.embeddings_url,
-            timeout=config.request_timeout,
-            model_id=config.embedding_model_id
-        )
-        
-        test_embedding = embedding_generator.generate_embedding("Connection test...")
-        if test_embedding is None:
-            raise logging_agent.log_error(RuntimeError("LM Studio is not connected or models weren't successfully loaded (API connection failed)"))
-        logging_agent.log_info("Embedding API connection test successful!")
-        
-        vector_manager = VectorManager(
-            embedding_generator=embedding_generator,
-            cache_file=config.cache_file,
-            logger=logging_agent
-        )
-        
-        cache_stats = vector_manager.get_stats()
-        logging_agent.log_info(f"Initial cache: {cache_stats['documents']} docs, {cache_stats['chunks']} chunks")
-        
-        logging_agent.log_info(f"Processing {len(config.document_paths)} documents...")
-        for i, path in enumerate(config.document_paths):
-            try:
-                if vector_manager.is_document_processed(path):
-                    logging_agent.log_info(f'[{i+1}/{len(config.document_paths)}] Document already processed: {path}')
-                    continue
-                    
-                logging_agent.log_info(f'[{i+1}/{len(config.document_paths)}] Processing document: {path}')
-                extracted_text = PDFFormatter.extract_text(path)
-                if not extracted_text or not extracted_text.strip():
-                    logging_agent.log_error(Exception("No text extracted"), {"message": f"Unable to extract text from the document: {path}"})
-                    continue
-                    
-                vector_manager.add_document(extracted_text, source_path=path)
-            except Exception as e:
-                logging_agent.log_error(e, {"message": f"File processing failed: {path}"})
-        
-        llm_client = LMStudioClient(api_url=config.completions_url)
-        chat = Chat(
-            vector_manager=vector_manager,
-            llm_client=llm_client,
-            model_id=config.completion_model_id,
-            config=ChatConfig(
-                temperature=config.temperature,
-                max_tokens=config.max_tokens,
-                max_history_length=config.max_history_length
+def log_configuration(config: AppConfig, logging_agent: LoggingManager) -> None:
+    logging_agent.log_info("Starting application with config:")
+    logging_agent.log_info(f"Embeddings URL: {config.embeddings_url}")
+    logging_agent.log_info(f"Completions URL: {config.completions_url}")
+    logging_agent.log_info(f"Embedding Model ID: {config.embedding_model_id}")
+    logging_agent.log_info(f"Completion Model ID: {config.completion_model_id}")
+    logging_agent.log_info(f"PDF Backend: {config.pdf_backend}")
+    logging_agent.log_info(f"Documents Directory: {config.documents_directory}\n")
+
+def check_connectivity(config: AppConfig, embedding_generator: EmbeddingGenerator, logging_agent: LoggingManager) -> None:
+    """Probes LM Studio for loaded models and a working embedding endpoint; raises RuntimeError otherwise."""
+    models = get_loaded_models(config.completions_url)
+    if not models:
+        raise RuntimeError("No models loaded in LM Studio. Please load a model and restart.")
+    logging_agent.log_info(f"Loaded models: {[m['id'] for m in models]}")
+
+    test_embedding = embedding_generator.generate_embedding("Connection test...")
+    if test_embedding is None:
+        raise RuntimeError("LM Studio is not connected or models weren't successfully loaded (API connection failed)")
+    logging_agent.log_info("Embedding API connection test successful!")
+
+def create_vector_manager(
+    config: AppConfig,
+    embedding_generator: EmbeddingGenerator,
+    cache_file: str,
+    shared_index_dir: str,
+    logging_agent: LoggingManager
+) -> VectorManager:
+    shared = config.workers > 1
+    return VectorManager(
+        embedding_generator=embedding_generator,
+        cache_file=cache_file,
+        logger=logging_agent,
+        verify_hashes=config.verify_document_hashes,
+        search_cache_size=config.search_cache_size,
+        shared_index_dir=shared_index_dir if shared else None,
+        read_only=shared and not elect_writer(config)
+    )
+
+def default_collection(config: AppConfig) -> Collection:
+    return Collection(name=DEFAULT_COLLECTION, documents_directory=config.documents_directory, cache_file=config.cache_file)
+
+def open_collection(
+    config: AppConfig,
+    collection: Collection,
+    vector_manager: VectorManager,
+    logging_agent: LoggingManager
+) -> LoadedCollection:
+    """Starts the background services of a collection; read-only workers run none of them."""
+    loaded = LoadedCollection(collection=collection, vector_manager=vector_manager)
+    if config.workers > 1:
+        # Read-only workers forward ingestion requests here; the writer drains them into its queue
+        loaded.ingest_spool = IngestSpool(collection.documents_directory, logger=logging_agent)
+    if vector_manager.read_only:
+        return loaded
+
+    loaded.ingest_queue = IngestQueue(
+        vector_manager,
+        pdf_backend=config.pdf_backend,
+        max_concurrency=config.ingest_max_concurrency,
+        logger=logging_agent
+    )
+    if loaded.ingest_spool is not None:
+        loaded.ingest_spool.start(loaded.ingest_queue)
+    loaded.compaction = CompactionWorker(vector_manager, dead_fraction=config.compaction_dead_fraction, logger=logging_agent)
+    loaded.compaction.start()
+    if config.watch_documents:
+        loaded.document_watcher = DocumentWatcher(
+            collection.documents_directory,
+            lambda changes: apply_document_changes(
+                changes, vector_manager, loaded.ingest_queue, collection.documents_directory, logging_agent
             ),
+            poll_interval=config.watch_poll_interval,
             logger=logging_agent
         )
+        loaded.document_watcher.start()
+    if vector_manager.needs_reembedding():
+        # The old index keeps answering, with its own model, until the new one is swapped in.
+        # An untagged cache is probed first and only re-embedded if its dimension doesn't match
+        embedded_with = (vector_manager.cache.embedding_model or {}).get('model_id', 'a model not identified yet')
+        logging_agent.log_info(
+            f"Collection '{collection.name}' was embedded with {embedded_with}; "
+            f"re-embedding with {config.embedding_model_id} in the background"
+        )
+        loaded.reembedding = ReembeddingJob(vector_manager, logger=logging_agent)
+        loaded.reembedding.start()
+    return loaded
+
+def load_collection(
+    config: AppConfig,
+    collection: Collection,
+    embedding_generator: EmbeddingGenerator,
+    logging_agent: LoggingManager
+) -> LoadedCollection:
+    """Loads a named collection on first use and queues whatever changed in its folder since."""
+    vector_manager = create_vector_manager(
+        config, embedding_generator, collection.cache_file, collection.cache_file + '.shared', logging_agent
+    )
+    loaded = open_collection(config, collection, vector_manager, logging_agent)
+    if loaded.ingest_queue is not None:
+        purge_missing_documents(collection.documents_directory, vector_manager, logging_agent)
+        for path in scan_documents(collection.documents_directory):
+            if not vector_manager.is_document_processed(path):
+                try:
+                    loaded.ingest_queue.submit(path)
+                except IngestQueueFull as e:
+                    logging_agent.log_error(e, {"message": f"Document not queued: {path}"})
+                    break
+        # The scan stamps file stats on documents it had to hash; save them so the next start skips hashing
+        vector_manager.flush()
+    return loaded
+
+def create_components(config: AppConfig, logging_agent: LoggingManager) -> tuple:
+    """Builds every component from the persisted cache without touching the network."""
+    embedding_generator = EmbeddingGenerator(
+        url=config.embeddings_url,
+        timeout=config.request_timeout,
+        model_id=config.embedding_model_id
+    )
+    
+    vector_manager = create_vector_manager(config, embedding_generator, config.cache_file, config.shared_index_dir, logging_agent)
+    
+    cache_stats = vector_manager.get_stats()
+    logging_agent.log_info(f"Initial cache: {cache_stats['documents']} docs, {cache_stats['chunks']} chunks")
+    
+    llm_client = LMStudioClient(api_url=config.completions_url)
+    chat_config = ChatConfig(
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        max_history_length=config.max_history_length,
+        context_length=config.model_context_length,
+        max_context_tokens=config.max_context_tokens
+    )
+    chat = Chat(
+        vector_manager=vector_manager,
+        llm_client=llm_client,
+        model_id=config.completion_model_id,
+        config=chat_config,
+        logger=logging_agent,
+        session_store=SessionStore(
+            system_message=chat_config.system_message,
+            max_history_length=config.max_history_length,
+            max_sessions=config.max_sessions,
+            ttl_seconds=config.session_ttl_seconds,
+            max_history_tokens=config.max_history_tokens,
+            summary_mode=config.history_summary_mode
+        ),
+        scheduler=LLMScheduler(max_concurrency=config.llm_max_concurrency),
+        answer_cache=SemanticAnswerCache(
+            max_entries=config.answer_cache_size,
+            threshold=config.answer_cache_threshold
+        )
+    )
+    return embedding_generator, vector_manager, chat
+
+def purge_missing_documents(documents_directory: str, vector_manager: VectorManager, logging_agent: LoggingManager) -> None:
+    """Removes indexed documents whose files were deleted from the documents directory."""
+    root = os.path.abspath(documents_directory)
+    missing = []
+    for source in vector_manager.document_sources():
+        path = os.path.abspath(source)
+        if os.path.commonpath([root, path]) == root and not os.path.exists(path):
+            missing.append(source)
+    copies = find_unindexed_copies(missing, vector_manager, documents_directory)
+    for source in missing:
+        logging_agent.log_info(f"Document no longer on disk, removing from index: {source}")
+        retire_document(source, vector_manager, documents_directory, logging_agent, copies)
+
+def process_documents(config: AppConfig, vector_manager: VectorManager, logging_agent: LoggingManager) -> None:
+    if vector_manager.read_only:
+        logging_agent.log_info("Reader worker: document ingestion is left to the writer process")
+        return
+
+    if not config.document_paths:
+        logging_agent.log_error(f"No PDF file found in {config.documents_directory}")
+        logging_agent.log_info("Please place your documents in the folder and try again.")
+    logging_agent.log_info(f"Found {len(config.document_paths)} PDF documents\n")
+    purge_missing_documents(config.documents_directory, vector_manager, logging_agent)
+
+    logging_agent.log_info(f"Processing {len(config.document_paths)} documents...")
+    for i, path in enumerate(config.document_paths):
+        try:
+            if vector_manager.is_document_processed(path):
+                logging_agent.log_info(f'[{i+1}/{len(config.document_paths)}] Document already processed: {path}')
+                continue
+                
+            logging_agent.log_info(f'[{i+1}/{len(config.document_paths)}] Processing document: {path}')
+            extracted_text = PDFFormatter.extract_text(path, backend=config.pdf_backend)
+            if not extracted_text or not extracted_text.strip():
+                logging_agent.log_error(Exception("No text extracted"), {"message": f"Unable to extract text from the document: {path}"})
+                continue
+                
+            vector_manager.add_document(extracted_text, source_path=path)
+        except Exception as e:
+            logging_agent.log_error(e, {"message": f"File processing failed: {path}"})
+    # The scan stamps file stats on documents it had to hash; save them so the next start skips hashing
+    vector_manager.flush()
+
+def initialize_components(config: AppConfig) -> tuple:
+    logging_agent = LoggingManager()
+    try:
+        log_configuration(config, logging_agent)
+        embedding_generator, vector_manager, chat = create_components(config, logging_agent)
+        check_connectivity(config, embedding_generator, logging_agent)
+        process_documents(config, vector_manager, logging_agent)
         
         logging_agent.log_info("Initialization completed successfully")
         return embedding_generator, vector_manager, chat
         
     except Exception as e:
         logging_agent.log_error(e, {"message": "Initialization failed"})
-        raise SystemExit("\n\nFatal initialization error, check the connection to LM Studio or the error messages above.\n") from e
\ No newline at end of file
+        raise SystemExit("\n\nFatal initialization error, check the connection to LM Studio or the error messages above.\n") from e
@@ -0,0 +1,346 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from constants import WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+from app.src.document_processing.ingest_queue import IngestQueue, IngestQueueFull, file_sha256
+from app.src.utils.logging_manager import LoggingManager
+
+Signature = Tuple[int, int]
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+@dataclass(frozen=True)
+class DocumentChange:
+    kind: str  # 'added', 'modified' or 'removed'
+    path: str
+
+def is_watched_document(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.lower().endswith('.pdf') and not name.startswith('.')
+
+def scan_documents(directory: str) -> Dict[str, Signature]:
+    """Size and mtime of every PDF under the directory, keyed like AppConfig discovers them."""
+    documents: Dict[str, Signature] = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            path = os.path.join(root, name)
+            if is_watched_document(path):
+                signature = _signature(path)
+                if signature is not None:
+                    documents[path] = signature
+    return documents
+
+def _signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class _Inotify:
+    """Minimal recursive inotify watch through libc; only the paths named by events are returned."""
+
+    def __init__(self, directory: str):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs: Dict[int, str] = {}
+        # Set when a new subdirectory could not be watched; the watcher then falls back to polling
+        self.degraded = False
+        try:
+            self.add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, directory: str) -> None:
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                # Usually fs.inotify.max_user_watches
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {root}')
+            self._dirs[wd] = root
+
+    def read(self, timeout: float) -> Tuple[Set[str], Set[str], bool]:
+        """Changed file paths, changed directories and whether the kernel queue overflowed."""
+        files: Set[str] = set()
+        dirs: Set[str] = set()
+        overflow = False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return files, dirs, overflow
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return files, dirs, overflow
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                del self._dirs[wd]
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                dirs.add(path)
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):
+                    try:
+                        self.add_tree(path)
+                    except OSError:
+                        self.degraded = True
+            elif is_watched_document(path):
+                files.add(path)
+        return files, dirs, overflow
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class DocumentWatcher:
+    """Follows a documents directory and reports PDFs that were added, modified or removed.
+
+    Events (inotify on Linux, a stat scan every `poll_interval` elsewhere) only mark paths as
+    pending; a path is reported once its size and mtime have been stable for `debounce`
+    seconds, so a file still being copied is ingested once, after the copy finishes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        on_changes: Callable[[List[DocumentChange]], None],
+        debounce: float = WATCH_DEBOUNCE_SECONDS,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        use_inotify: bool = True,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.directory = directory
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and os.name == 'posix'
+        self.logger = logger or LoggingManager()
+
+        self.known: Dict[str, Signature] = {}
+        self._pending: Dict[str, Tuple[float, Optional[Signature]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.backend = 'polling'
+        self.changes_reported = 0
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.known = scan_documents(self.directory)
+        self._thread = threading.Thread(target=self._run, name='document-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _mark(self, paths, now: float) -> None:
+        for path in paths:
+            self._pending[path] = (now, _signature(path))
+
+    def _mark_tree(self, directory: str, now: float) -> None:
+        prefix = os.path.join(directory, '')
+        self._mark([path for path in self.known if path.startswith(prefix)], now)
+        if os.path.isdir(directory):
+            self._mark(scan_documents(directory), now)
+
+    def _run(self) -> None:
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify(self.directory)
+                self.backend = 'inotify'
+            except (OSError, AttributeError) as e:
+                self.logger.log_info(f'inotify unavailable ({e}); polling {self.directory} every {self.poll_interval}s')
+        self.logger.log_info(f'Watching {self.directory} for PDF changes ({self.backend})')
+
+        last_scan = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                timeout = min(self.debounce, self.poll_interval) / 2
+                now = time.monotonic()
+                if inotify is not None:
+                    files, dirs, overflow = inotify.read(timeout)
+                    now = time.monotonic()
+                    self._mark(files, now)
+                    for directory in dirs:
+                        self._mark_tree(directory, now)
+                    if overflow:
+                        self._mark_tree(self.directory, now)
+                    if inotify.degraded:
+                        self.logger.log_info(f'inotify watch limit reached; polling {self.directory} every {self.poll_interval}s')
+                        inotify.close()
+                        inotify = None
+                        self.backend = 'polling'
+                        self._mark_tree(self.directory, now)
+                elif now - last_scan >= self.poll_interval:
+                    last_scan = now
+                    self._poll(now)
+                else:
+                    self._stop.wait(timeout)
+                self._flush(time.monotonic())
+        except Exception as e:
+            self.logger.log_error(e, {'message': f'Document watcher stopped: {self.directory}'})
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _poll(self, now: float) -> None:
+        current = scan_documents(self.directory)
+        changed = [path for path, signature in current.items() if self.known.get(path) != signature]
+        changed += [path for path in self.known if path not in current]
+        self._mark([path for path in changed if path not in self._pending], now)
+
+    def _flush(self, now: float) -> None:
+        changes: List[DocumentChange] = []
+        for path, (marked_at, signature) in list(self._pending.items()):
+            if now - marked_at < self.debounce:
+                continue
+            current = _signature(path)
+            if current != signature:
+                # Still being written: restart the quiet period
+                self._pending[path] = (now, current)
+                continue
+            del self._pending[path]
+            if current is None:
+                if self.known.pop(path, None) is not None:
+                    changes.append(DocumentChange('removed', path))
+            elif self.known.get(path) != current:
+                changes.append(DocumentChange('modified' if path in self.known else 'added', path))
+                self.known[path] = current
+
+        if changes:
+            self.changes_reported += len(changes)
+            try:
+                self.on_changes(changes)
+            except Exception as e:
+                self.logger.log_error(e, {'message': 'Applying document changes failed'})
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            'backend': self.backend,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'documents': len(self.known),
+            'pending': len(self._pending),
+            'changes_reported': self.changes_reported
+        }
+
+def find_unindexed_copies(removed: List[str], vector_manager, documents_directory: str) -> Dict[str, str]:
+    """Maps content hash to path for the PDFs under the directory that may be skipped duplicates of `removed`.
+
+    Only files not indexed under their own path and, where the removed documents' sizes are known,
+    of one of those sizes are hashed; hashes are memoized by the vector manager.
+    """
+    if not removed:
+        return {}
+    sizes: Optional[Set[int]] = set()
+    for doc_id in removed:
+        size = vector_manager.document_size(doc_id)
+        if size is None:
+            sizes = None
+            break
+        sizes.add(size)
+    indexed = set(vector_manager.document_sources())
+    copies: Dict[str, str] = {}
+    for path in scan_documents(documents_directory):
+        if path in indexed:
+            continue
+        try:
+            if sizes is not None and os.path.getsize(path) not in sizes:
+                continue
+            copies.setdefault(vector_manager.file_hash(path), path)
+        except OSError:
+            continue
+    return copies
+
+def retire_document(
+    doc_id: str,
+    vector_manager,
+    documents_directory: str,
+    logger: Optional[LoggingManager] = None,
+    copies: Optional[Dict[str, str]] = None
+) -> None:
+    """Drops a deleted document from the index, unless a copy deduplicated against it is still on disk.
+
+    Ingestion skips content that is already indexed under another path, so the chunks of `doc_id`
+    may be all that covers such a copy; they are relabelled to it instead of being removed.
+    Callers retiring several documents pass `copies` from one `find_unindexed_copies` call.
+    """
+    logger = logger or LoggingManager()
+    if copies is None:
+        copies = find_unindexed_copies([doc_id], vector_manager, documents_directory)
+    file_hash = vector_manager.document_hash(doc_id)
+    copy = copies.pop(file_hash, None) if file_hash is not None else None
+    if copy is not None and vector_manager.rename_document(doc_id, copy):
+        logger.log_info(f'Document {doc_id} was deleted; its content stays indexed as {copy}')
+        return
+    vector_manager.remove_document(doc_id)
+
+def apply_document_changes(
+    changes: List[DocumentChange],
+    vector_manager,
+    ingest_queue: IngestQueue,
+    documents_directory: str,
+    logger: Optional[LoggingManager] = None
+) -> None:
+    """Removes, renames or queues documents so the index follows the folder.
+
+    A removal and an addition with the same content in one batch is a move: the chunks are
+    relabelled instead of embedded again.
+    """
+    logger = logger or LoggingManager()
+    removed = [change.path for change in changes if change.kind == 'removed']
+    updated = [change.path for change in changes if change.kind != 'removed']
+
+    removed_hashes = {vector_manager.document_hash(path): path for path in removed}
+    removed_hashes.pop(None, None)
+    for path in updated:
+        try:
+            file_hash = file_sha256(path)
+        except OSError as e:
+            logger.log_error(e, {'message': f'Cannot read changed document: {path}'})
+            continue
+        old_path = removed_hashes.pop(file_hash, None)
+        if old_path is not None:
+            removed.remove(old_path)
+            vector_manager.rename_document(old_path, path)
+            continue
+        try:
+            job, created = ingest_queue.submit(path, file_hash)
+            logger.log_info(f'Document {path} changed: ingest job {job.job_id} ({job.status if not created else "queued"})')
+        except IngestQueueFull as e:
+            logger.log_error(e, {'message': f'Document {path} not queued'})
+
+    copies = find_unindexed_copies(removed, vector_manager, documents_directory)
+    for path in removed:
+        retire_document(path, vector_manager, documents_directory, logger, copies)
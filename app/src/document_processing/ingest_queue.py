@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import (
+    HASH_CHUNK_SIZE, INGEST_JOB_HISTORY, INGEST_MAX_CONCURRENCY, INGEST_MAX_PENDING, WATCH_POLL_INTERVAL
+)
+from app.src.document_processing.pdf_formatter import PDFFormatter
+from app.src.utils.logging_manager import LoggingManager
+
+ACTIVE_STATUSES = ('queued', 'extracting', 'embedding')
+UPLOAD_DIRECTORY = 'uploads'
+# Hidden, so the document watcher never mistakes forwarded requests for documents
+SPOOL_DIRECTORY = '.ingest-spool'
+
+class IngestCancelled(Exception):
+    pass
+
+class IngestQueueFull(Exception):
+    pass
+
+class IngestQueueClosed(Exception):
+    pass
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def resolve_document_path(documents_directory: str, path: str) -> str:
+    """Path of a PDF inside the documents directory, spelled the way AppConfig discovers it.
+
+    Raises ValueError for anything outside the directory or not a PDF.
+    """
+    root = os.path.realpath(documents_directory)
+    candidate = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, candidate]) != root:
+        raise ValueError('Path must be inside the documents directory')
+    if not candidate.lower().endswith('.pdf'):
+        raise ValueError('Only PDF files can be ingested')
+    if not os.path.isfile(candidate):
+        raise FileNotFoundError(f'No such document: {path}')
+    # Document IDs are paths, so the same file must always be spelled the same way
+    return os.path.join(documents_directory, os.path.relpath(candidate, root))
+
+def store_upload(documents_directory: str, filename: str, temp_path: str, file_hash: str) -> Tuple[str, bool]:
+    """Moves a finished upload into the documents directory, keeping existing files with other content.
+
+    Returns the path and whether a new file was created there, as opposed to an identical one reused.
+    """
+    name = re.sub(r'[^\w.\- ]', '_', os.path.basename(filename or '')).strip(' .') or 'upload'
+    if not name.lower().endswith('.pdf'):
+        name += '.pdf'
+    directory = os.path.join(documents_directory, UPLOAD_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        if file_sha256(target) == file_hash:
+            os.remove(temp_path)
+            return target, False
+        target = os.path.join(directory, f'{file_hash[:12]}-{name}')
+    os.replace(temp_path, target)
+    return target, True
+
+@dataclass
+class IngestJob:
+    job_id: str
+    source: str
+    file_hash: str
+    status: str = 'queued'
+    error: Optional[str] = None
+    pages_done: int = 0
+    pages_total: int = 0
+    chunks_done: int = 0
+    chunks_total: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Rate is measured over the chunks embedded by this run, not those resumed from a checkpoint
+    _embed_started: Optional[float] = field(default=None, repr=False)
+    _chunks_resumed: int = field(default=0, repr=False)
+
+    def on_pages(self, done: int, total: int) -> None:
+        self.pages_done, self.pages_total = done, total
+
+    def on_chunks(self, done: int, total: int) -> None:
+        if self._embed_started is None:
+            self.status = 'embedding'
+            self._embed_started = time.monotonic()
+            self._chunks_resumed = done
+        self.chunks_done, self.chunks_total = done, total
+
+    def embeddings_per_second(self) -> float:
+        if self._embed_started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._embed_started
+        embedded = self.chunks_done - self._chunks_resumed
+        return embedded / elapsed if elapsed > 0 and embedded > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        rate = self.embeddings_per_second()
+        remaining = self.chunks_total - self.chunks_done
+        return {
+            'job_id': self.job_id,
+            'source': self.source,
+            'file_hash': self.file_hash,
+            'status': self.status,
+            'error': self.error,
+            'pages': {'done': self.pages_done, 'total': self.pages_total},
+            'chunks': {'done': self.chunks_done, 'total': self.chunks_total},
+            'embeddings_per_second': round(rate, 2),
+            'eta_seconds': round(remaining / rate, 1) if self.status == 'embedding' and rate > 0 else None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class IngestQueue:
+    """Runs document ingestion jobs in the background with bounded concurrency.
+
+    Extraction and embedding of concurrent jobs overlap; only appending a finished batch takes
+    the vector manager's write lock, and searches keep reading the published snapshot throughout.
+    Jobs are keyed by file hash: submitting content that is already queued or running returns
+    that job, and a new job for content that is already indexed finishes as a duplicate without
+    embedding.
+    """
+
+    def __init__(
+        self,
+        vector_manager,
+        pdf_backend: Optional[str] = None,
+        max_concurrency: int = INGEST_MAX_CONCURRENCY,
+        max_pending: int = INGEST_MAX_PENDING,
+        history: int = INGEST_JOB_HISTORY,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.vector_manager = vector_manager
+        self.pdf_backend = pdf_backend
+        self.max_pending = max_pending
+        self.history = history
+        self.logger = logger or LoggingManager()
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='ingest')
+        self._jobs: 'OrderedDict[str, IngestJob]' = OrderedDict()
+        self._by_hash: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def find(self, file_hash: str) -> Optional[IngestJob]:
+        with self._lock:
+            job_id = self._by_hash.get(file_hash)
+            return self._jobs.get(job_id) if job_id else None
+
+    def check_capacity(self) -> None:
+        """Raises IngestQueueFull when a new job would be refused, e.g. before storing an upload for it."""
+        with self._lock:
+            self._check_capacity_locked()
+
+    def _check_capacity_locked(self) -> None:
+        pending = sum(1 for job in self._jobs.values() if job.status in ACTIVE_STATUSES)
+        if pending >= self.max_pending:
+            raise IngestQueueFull(f'{pending} ingestion jobs are already pending')
+
+    def submit(self, path: str, file_hash: Optional[str] = None) -> Tuple[IngestJob, bool]:
+        """Queues a PDF for ingestion; returns the job and whether it was newly created."""
+        file_hash = file_hash or file_sha256(path)
+        with self._lock:
+            # Closed when its collection is evicted, possibly under a request that still holds it
+            if self._stopping.is_set():
+                raise IngestQueueClosed('The collection was unloaded; retry the request')
+            existing = self._jobs.get(self._by_hash.get(file_hash, ''))
+            if existing is not None:
+                return existing, False
+            self._check_capacity_locked()
+
+            job = IngestJob(job_id=uuid.uuid4().hex, source=path, file_hash=file_hash)
+            self._jobs[job.job_id] = job
+            self._by_hash[file_hash] = job.job_id
+            self._prune_locked()
+        try:
+            self._executor.submit(self._run, job)
+        except RuntimeError:
+            # close() shut the executor down after the check above
+            job.status = 'cancelled'
+            with self._lock:
+                del self._by_hash[file_hash]
+            raise IngestQueueClosed('The collection was unloaded; retry the request')
+        return job, True
+
+    def _prune_locked(self) -> None:
+        finished = [job for job in self._jobs.values() if job.status not in ACTIVE_STATUSES]
+        for job in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job.job_id]
+
+    def _check_stopping(self) -> None:
+        if self._stopping.is_set():
+            raise IngestCancelled('Server is shutting down')
+
+    def _run(self, job: IngestJob) -> None:
+        job.started_at = time.time()
+        try:
+            self._check_stopping()
+            if self.vector_manager.is_document_processed(job.source):
+                job.status = 'duplicate'
+                self.logger.log_info(f'Ingest job {job.job_id}: already indexed: {job.source}')
+                return
+
+            job.status = 'extracting'
+            text = PDFFormatter.extract_text(job.source, backend=self.pdf_backend, on_pages=self._track(job.on_pages))
+            if not text:
+                raise ValueError(f'No text extracted from {job.source}')
+
+            self._check_stopping()
+            if self.vector_manager.add_document(text, source_path=job.source, progress=self._track(job.on_chunks)):
+                job.status = 'done'
+            else:
+                job.status = 'failed'
+                job.error = 'Not every chunk could be embedded; resubmit to resume from the checkpoint'
+        except Exception as e:
+            job.error = str(e)
+            if self._stopping.is_set():
+                job.status = 'cancelled'
+            else:
+                job.status = 'failed'
+                self.logger.log_error(e, {'message': f'Ingest job {job.job_id} failed: {job.source}'})
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._by_hash.get(job.file_hash) == job.job_id:
+                    del self._by_hash[job.file_hash]
+            self.logger.log_info(f'Ingest job {job.job_id} {job.status}: {job.source}')
+
+    def _track(self, update):
+        def progress(done: int, total: int) -> None:
+            update(done, total)
+            self._check_stopping()
+        return progress
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def active_jobs(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ACTIVE_STATUSES)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in set(statuses)}
+
+    def close(self) -> None:
+        """Stops running jobs at their next progress report; embedded batches stay checkpointed."""
+        with self._lock:
+            self._stopping.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class IngestSpool:
+    """Ingestion requests handed from read-only workers to the writer through a directory.
+
+    A reader drops one JSON file per request into the collection's spool directory; the
+    writer polls it, submits each request to its ingest queue and deletes the file. Requests
+    that meet a full queue stay in the spool for the next poll.
+    """
+
+    def __init__(
+        self,
+        documents_directory: str,
+        max_pending: int = INGEST_MAX_PENDING,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.directory = os.path.join(documents_directory, SPOOL_DIRECTORY)
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.logger = logger or LoggingManager()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _requests(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if name.endswith('.json')]
+
+    def check_capacity(self) -> None:
+        pending = len(self._requests())
+        if pending >= self.max_pending:
+            raise IngestQueueFull(f'{pending} forwarded ingestion requests are already pending')
+
+    def forward(self, path: str, file_hash: Optional[str] = None) -> str:
+        """Spools a request for the writer; returns its ID."""
+        self.check_capacity()
+        os.makedirs(self.directory, exist_ok=True)
+        request_id = uuid.uuid4().hex
+        # Timestamped names keep the writer's polls in arrival order
+        name = f'{time.time_ns():020d}-{request_id}.json'
+        temp_file = os.path.join(self.directory, f'.{name}.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump({'path': path, 'file_hash': file_hash}, f)
+        os.replace(temp_file, os.path.join(self.directory, name))
+        return request_id
+
+    def drain(self, ingest_queue: IngestQueue) -> int:
+        """Submits spooled requests in order until the queue is full; returns how many were taken."""
+        submitted = 0
+        for request_file in self._requests():
+            try:
+                with open(request_file, 'r') as f:
+                    request = json.load(f)
+                job, _ = ingest_queue.submit(request['path'], request.get('file_hash'))
+                self.logger.log_info(f"Forwarded ingestion of {request['path']}: job {job.job_id}")
+            except IngestQueueFull:
+                break
+            except (OSError, ValueError, KeyError) as e:
+                # The document is gone or the request is unreadable; retrying would not help
+                self.logger.log_error(e, {'message': f'Dropping forwarded ingestion request {request_file}'})
+            try:
+                os.remove(request_file)
+            except OSError:
+                pass
+            submitted += 1
+        return submitted
+
+    def start(self, ingest_queue: IngestQueue) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(ingest_queue,), name='ingest-spool', daemon=True)
+        self._thread.start()
+
+    def _run(self, ingest_queue: IngestQueue) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.drain(ingest_queue)
+            except Exception as e:
+                self.logger.log_error(e, {'message': f'Draining {self.directory} failed'})
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
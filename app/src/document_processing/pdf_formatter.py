@@ -1,44 +1,213 @@
 import re
 import sys
-from io import StringIO
-from typing import Optional
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Type
 import pdfplumber
 
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+from constants import DEFAULT_PDF_BACKEND, EXTRACT_PAGE_BATCH, MIN_PAGE_TEXT_CHARS, MIN_PAGE_TEXT_QUALITY
+
+class PDFDocument(ABC):
+    """An open PDF whose pages are read one at a time without parsing the file again."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def page_text(self, index: int) -> str:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'PDFDocument':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class PDFBackend(ABC):
+    name: str = ''
+
+    @abstractmethod
+    def open(self, doc_path: str) -> PDFDocument:
+        pass
+
+    def extract_pages(
+        self,
+        doc_path: str,
+        page_numbers: Optional[Sequence[int]] = None,
+        on_pages: Optional[Callable[[int, int], None]] = None
+    ) -> List[str]:
+        """Extracts pages from one open document; `on_pages(done, total)` is called every EXTRACT_PAGE_BATCH pages."""
+        with self.open(doc_path) as document:
+            indices = range(len(document)) if page_numbers is None else list(page_numbers)
+            total = len(indices)
+            if on_pages is not None:
+                on_pages(0, total)
+            pages = []
+            for index in indices:
+                pages.append(document.page_text(index))
+                if on_pages is not None and (len(pages) % EXTRACT_PAGE_BATCH == 0 or len(pages) == total):
+                    on_pages(len(pages), total)
+            return pages
+
+class PdfPlumberDocument(PDFDocument):
+    def __init__(self, doc_path: str):
+        self.pdf = pdfplumber.open(doc_path)
+
+    def __len__(self) -> int:
+        return len(self.pdf.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.pdf.pages[index].extract_text(x_tolerance=1, y_tolerance=1) or ''
+
+    def close(self) -> None:
+        self.pdf.close()
+
+class PdfPlumberBackend(PDFBackend):
+    name = 'pdfplumber'
+
+    def open(self, doc_path: str) -> PDFDocument:
+        return PdfPlumberDocument(doc_path)
+
+class PyPDFDocument(PDFDocument):
+    def __init__(self, doc_path: str):
+        self.reader = pypdf.PdfReader(doc_path)
+
+    def __len__(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ''
+
+class PyPDFBackend(PDFBackend):
+    name = 'pypdf'
+
+    def __init__(self):
+        if pypdf is None:
+            raise ImportError("pypdf is not installed. Install it or select the 'pdfplumber' backend")
+
+    def open(self, doc_path: str) -> PDFDocument:
+        return PyPDFDocument(doc_path)
+
+class FallbackDocument(PDFDocument):
+    def __init__(self, doc_path: str, fast: Optional[PDFBackend], accurate: PDFBackend):
+        self.doc_path = doc_path
+        self.accurate_backend = accurate
+        self.fast: Optional[PDFDocument] = None
+        self.accurate: Optional[PDFDocument] = None
+        if fast is not None:
+            try:
+                self.fast = fast.open(doc_path)
+            except Exception:
+                self.fast = None
+        if self.fast is None:
+            self.accurate = accurate.open(doc_path)
+
+    def __len__(self) -> int:
+        return len(self.fast) if self.fast is not None else len(self.accurate)
+
+    def page_text(self, index: int) -> str:
+        if self.fast is not None:
+            try:
+                text = self.fast.page_text(index)
+            except Exception:
+                text = ''
+            if page_text_looks_valid(text):
+                return text
+        # The accurate document is opened on the first bad page and kept for the rest
+        if self.accurate is None:
+            self.accurate = self.accurate_backend.open(self.doc_path)
+        return self.accurate.page_text(index)
+
+    def close(self) -> None:
+        for document in (self.fast, self.accurate):
+            if document is not None:
+                document.close()
+
+class FallbackBackend(PDFBackend):
+    """Extracts with the fast backend and re-extracts empty or garbled pages with the accurate one."""
+    name = 'auto'
+
+    def __init__(self, fast: Optional[PDFBackend] = None, accurate: Optional[PDFBackend] = None):
+        self.fast = fast or (PyPDFBackend() if pypdf is not None else None)
+        self.accurate = accurate or PdfPlumberBackend()
+
+    def open(self, doc_path: str) -> PDFDocument:
+        return FallbackDocument(doc_path, self.fast, self.accurate)
+
+PDF_BACKENDS: Dict[str, Type[PDFBackend]] = {
+    PdfPlumberBackend.name: PdfPlumberBackend,
+    PyPDFBackend.name: PyPDFBackend,
+    FallbackBackend.name: FallbackBackend,
+}
+
+def get_backend(name: str = DEFAULT_PDF_BACKEND) -> PDFBackend:
+    try:
+        return PDF_BACKENDS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown PDF backend '{name}'. Available: {', '.join(PDF_BACKENDS)}")
+
+def page_text_looks_valid(text: str) -> bool:
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_TEXT_CHARS:
+        return False
+    if '(cid:' in stripped or '�' in stripped:
+        return False
+
+    readable = sum(1 for c in stripped if c.isalnum() or c.isspace() or c in '.,;:!?()-%\'"')
+    if readable / len(stripped) < MIN_PAGE_TEXT_QUALITY:
+        return False
+
+    # Words glued together with no spacing are a common pypdf failure on tight layouts
+    spaces = stripped.count(' ') + stripped.count('\n')
+    return spaces / len(stripped) >= 0.05
+
 class PDFFormatter:
     @staticmethod
-    def extract_text(doc_path: str) -> Optional[str]:
+    def extract_text(
+        doc_path: str,
+        backend: Optional[str] = None,
+        on_pages: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[str]:
+        """Extracts and cleans the text of a PDF; `on_pages(done, total)` reports page progress."""
         if not doc_path.endswith('.pdf'):
             raise ValueError('File must be a PDF')
-            
-        text_content = []
+
         try:
-            with pdfplumber.open(doc_path) as pdf:
-                for page in pdf.pages:
-                    text_content.append(page.extract_text(x_tolerance=1, y_tolerance=1) or '')
-            
+            pdf_backend = get_backend(backend or DEFAULT_PDF_BACKEND)
+            text_content = pdf_backend.extract_pages(doc_path, on_pages=on_pages)
+
             text = "\n".join(text_content)
-            
+
             text = re.sub(r'journal homepage:.*?\n', '', text, flags=re.IGNORECASE)
             text = re.sub(r'^\s*Keywords:.*?\n', '', text, flags=re.MULTILINE | re.IGNORECASE)
             text = re.sub(r'^\s*Corresponding author:.*?\n', '', text, flags=re.MULTILINE | re.IGNORECASE)
             text = re.sub(r'\n\s*\n', '\n\n', text)
             return text.strip() if text else None
-                                
+
         except Exception as e:
             raise RuntimeError(f'Failed to extract text from PDF: {str(e)}') from e
 
-def read_file(path, output_filename='output.txt'):
-    text = PDFFormatter.extract_text(path)
+def read_file(path, output_filename='output.txt', backend=None):
+    text = PDFFormatter.extract_text(path, backend)
     with open(output_filename, 'w', encoding='utf-8') as f:
         f.write(text or "")
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python alternative.py <pdf-file> [output-file]")
+        print("Usage: python alternative.py <pdf-file> [output-file] [backend]")
         return
     input_path = sys.argv[1]
     output_filename = sys.argv[2] if len(sys.argv) > 2 else 'output.txt'
-    read_file(input_path, output_filename)
+    backend = sys.argv[3] if len(sys.argv) > 3 else None
+    read_file(input_path, output_filename, backend)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
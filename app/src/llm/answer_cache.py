@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from constants import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD
+
+# Retrieved (source, chunk_idx) pairs plus a digest of the conversation the question was asked in
+ContextKey = Tuple[FrozenSet[Tuple[str, int]], str]
+
+@dataclass
+class _CachedAnswer:
+    embedding: np.ndarray
+    context_key: ContextKey
+    answer: str
+
+class SemanticAnswerCache:
+    """LRU cache of generated answers, matched by query-embedding cosine similarity.
+
+    An answer is reused only when the new query is close enough to a cached one, retrieval
+    returned the same chunks and the preceding conversation is identical, so a follow-up such
+    as "and the second one?" never gets another session's answer. Entries are dropped whenever the index version
+    they were produced against changes.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries: 'OrderedDict[int, _CachedAnswer]' = OrderedDict()
+        self._next_id = 0
+        self._index_version: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: Tuple[int, ...] = ()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def context_key(context_chunks, history: List[Dict[str, str]]) -> ContextKey:
+        """`history` is the conversation as the model sees it before the question, system prompt included."""
+        chunks = frozenset((source, chunk_idx) for _, _, source, chunk_idx in context_chunks)
+        digest = hashlib.sha256(
+            json.dumps([(m['role'], m['content']) for m in history], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        return chunks, digest
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _sync_version_locked(self, index_version: int) -> None:
+        if self._index_version != index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._index_version = index_version
+
+    def _similarity_matrix_locked(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix_ids = tuple(self._entries)
+            self._matrix = np.vstack([entry.embedding for entry in self._entries.values()])
+        return self._matrix
+
+    def lookup(self, query_embedding, context_key: ContextKey, index_version: int) -> Optional[str]:
+        if not self.enabled or query_embedding is None:
+            return None
+        query = self._normalize(query_embedding)
+        if query is None:
+            return None
+
+        with self._lock:
+            self._sync_version_locked(index_version)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            sims = self._similarity_matrix_locked() @ query
+            for position in np.argsort(sims)[::-1]:
+                if sims[position] < self.threshold:
+                    break
+                entry_id = self._matrix_ids[position]
+                entry = self._entries[entry_id]
+                if entry.context_key == context_key:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, context_key: ContextKey, index_version: int, answer: str) -> None:
+        if not self.enabled or query_embedding is None or not answer:
+            return
+        query = self._normalize(query_embedding)
+        if query is None:
+            return
+
+        with self._lock:
+            self._sync_version_locked(index_version)
+            self._entries[self._next_id] = _CachedAnswer(query, context_key, answer)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
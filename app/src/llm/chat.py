@@ -2,14 +2,28 @@ import re
 import os
 import json
 import time
+import asyncio
 import hashlib
-from typing import Generator, List, Dict, Optional
+import weakref
+from typing import Any, AsyncGenerator, Generator, List, Dict, Optional, Tuple
 from dataclasses import dataclass
+import httpx
 import requests
+import tiktoken
 
-from constants import DEFAULT_TIMEOUT, MAX_HISTORY_LENGTH, MAX_TOKENS, TEMPERATURE
+from constants import (
+    CONTEXT_SAFETY_MARGIN_TOKENS, DEFAULT_TIMEOUT, LLM_MAX_CONNECTIONS, MAX_CONTEXT_CHUNKS,
+    MAX_CONTEXT_TOKENS, MAX_EXCERPT_TOKENS, MAX_HISTORY_LENGTH, MAX_TOKENS,
+    MESSAGE_OVERHEAD_TOKENS, MODEL_CONTEXT_LENGTH, TEMPERATURE
+)
 from app.src.vector.vector_manager import VectorManager
+from app.src.vector.sentence_index import query_terms
+from app.src.llm.answer_cache import ContextKey, SemanticAnswerCache
+from app.src.llm.scheduler import LLMScheduler
+from app.src.llm.session_store import SessionStore
+from app.src.utils.latency import RATE_BUCKETS, LatencyRecorder, RequestTimer
 from app.src.utils.logging_manager import LoggingManager
+from app.src.utils.lru_cache import LRUCache
 
 class LLMClient:
     def stream_response(
@@ -21,10 +35,49 @@ class LLMClient:
     ) -> Generator[str, None, None]:
         raise NotImplementedError
 
+    async def astream_response(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncGenerator[str, None]:
+        raise NotImplementedError
+        yield
+
+    async def aclose(self) -> None:
+        pass
+
+def parse_sse_content(line: str) -> Optional[str]:
+    if not line.startswith('data:'):
+        return None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return None
+    if 'choices' in chunk and chunk['choices']:
+        delta = chunk['choices'][0].get('delta', {})
+        return delta.get('content')
+    return None
+
 class LMStudioClient(LLMClient):
-    def __init__(self, api_url: str, timeout: int = DEFAULT_TIMEOUT):
+    def __init__(self, api_url: str, timeout: int = DEFAULT_TIMEOUT, max_connections: int = LLM_MAX_CONNECTIONS):
         self.api_url = api_url
         self.timeout = timeout
+        self.max_connections = max_connections
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def _build_payload(self, messages: List[Dict[str, str]], model: str, temperature: float, max_tokens: int) -> dict:
+        return {
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'model': model,
+            'stream': True,
+        }
         
     def stream_response(
         self, 
@@ -33,13 +86,7 @@ class LMStudioClient(LLMClient):
         temperature: float, 
         max_tokens: int
     ) -> Generator[str, None, None]:
-        payload = {
-            'messages': messages,
-            'temperature': temperature,
-            'max_tokens': max_tokens,
-            'model': model,
-            'stream': True,
-        }
+        payload = self._build_payload(messages, model, temperature, max_tokens)
 
         try:
             with requests.post(
@@ -53,23 +100,55 @@ class LMStudioClient(LLMClient):
                 
                 for line in response.iter_lines():
                     if line:
-                        decoded_line = line.decode('utf-8')
-                        if decoded_line.startswith('data:'):
-                            data = decoded_line[5:].strip()
-                            if data != '[DONE]':
-                                try:
-                                    chunk = json.loads(data)
-                                    if 'choices' in chunk and chunk['choices']:
-                                        delta = chunk['choices'][0].get('delta', {})
-                                        if 'content' in delta:
-                                            yield delta['content']
-                                except json.JSONDecodeError:
-                                    continue
+                        content = parse_sse_content(line.decode('utf-8'))
+                        if content:
+                            yield content
         except requests.exceptions.RequestException as e:
             yield f'\nERROR: Connection failed. Reason: {str(e)}'
         except Exception as e:
             yield f'\nERROR: Unexpected error. Reason: {str(e)}'
 
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the event loop that serves requests
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                headers={'Content-Type': 'application/json'}
+            )
+        return self._async_client
+
+    async def astream_response(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncGenerator[str, None]:
+        payload = self._build_payload(messages, model, temperature, max_tokens)
+
+        try:
+            async with self._get_async_client().stream('POST', self.api_url, json=payload) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if line:
+                        content = parse_sse_content(line)
+                        if content:
+                            yield content
+        except httpx.HTTPError as e:
+            yield f'\nERROR: Connection failed. Reason: {str(e)}'
+        except Exception as e:
+            yield f'\nERROR: Unexpected error. Reason: {str(e)}'
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
 @dataclass
 class ChatConfig:
     system_message = (
@@ -92,6 +171,41 @@ class ChatConfig:
     temperature: float = TEMPERATURE
     max_tokens: int = MAX_TOKENS
     max_history_length: int = MAX_HISTORY_LENGTH
+    context_length: int = MODEL_CONTEXT_LENGTH
+    max_context_tokens: int = MAX_CONTEXT_TOKENS
+    max_excerpt_tokens: int = MAX_EXCERPT_TOKENS
+
+@dataclass
+class PromptBreakdown:
+    system: int = 0
+    history: int = 0
+    question: int = 0
+    context: int = 0
+    context_budget: int = 0
+    completion_reserved: int = 0
+
+    @property
+    def prompt_total(self) -> int:
+        return self.system + self.history + self.question + self.context
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'system': self.system,
+            'history': self.history,
+            'question': self.question,
+            'context': self.context,
+            'context_budget': self.context_budget,
+            'prompt_total': self.prompt_total,
+            'completion_reserved': self.completion_reserved
+        }
+
+@dataclass
+class PreparedTurn:
+    query_embedding: Any
+    context_key: ContextKey
+    index_version: int
+    answer_cache: SemanticAnswerCache
+    user_message: Dict[str, str]
 
 class Chat:
     def __init__(
@@ -100,67 +214,371 @@ class Chat:
         llm_client: LLMClient,
         model_id: str,
         config: ChatConfig = ChatConfig(),
-        logger: Optional[LoggingManager] = None
+        logger: Optional[LoggingManager] = None,
+        session_store: Optional[SessionStore] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None
     ):
         self.vector_manager = vector_manager
         self.llm_client = llm_client
         self.model_id = model_id
         self.config = config
         self.logger = logger or LoggingManager()
-        self.conversation_history = [{
-            'role': 'system',
-            'content': config.system_message
-        }]
+        self.sessions = session_store or SessionStore(
+            system_message=config.system_message,
+            max_history_length=config.max_history_length
+        )
+        self.scheduler = scheduler or LLMScheduler()
+        self.answer_cache = answer_cache or SemanticAnswerCache()
+        # Other collections get their own answer cache, dropped with their vector manager
+        self._answer_caches: 'weakref.WeakKeyDictionary[VectorManager, SemanticAnswerCache]' = weakref.WeakKeyDictionary()
+        self.cancelled_generations = 0
+        self.max_tokens_unspent = 0
+        self.encoding = tiktoken.get_encoding('cl100k_base')
+        self._token_counts = LRUCache(1024)
+        if self.sessions.token_counter is None:
+            self.sessions.token_counter = self._count_tokens
+        self.last_prompt_breakdown: Optional[PromptBreakdown] = None
+        self.latency = LatencyRecorder()
         self.last_request_time = 0
         self.min_request_interval = 1.0
 
-    def stream_chat(self, user_input: str):
-        self.logger.log_info(f"Processing user input (stream): {user_input[:100]}...")
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        return self.sessions.snapshot()
 
-        context_chunks = self.vector_manager.search(user_input)
+    def reset(self, session_id: Optional[str] = None) -> None:
+        self.sessions.reset(session_id)
+
+    def _count_tokens(self, text: str) -> int:
+        # History messages are re-counted every turn, so their counts are memoized by content
+        count = self._token_counts.get(text)
+        if count is None:
+            count = len(self.encoding.encode_ordinary(text))
+            self._token_counts.put(text, count)
+        return count
+
+    def _plan_prompt(self, user_input: str, history: List[Dict[str, str]]) -> PromptBreakdown:
+        breakdown = PromptBreakdown(
+            system=self._count_tokens(history[0]['content']) + MESSAGE_OVERHEAD_TOKENS,
+            history=sum(self._count_tokens(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in history[1:]),
+            question=self._count_tokens(user_input) + MESSAGE_OVERHEAD_TOKENS,
+            completion_reserved=self.config.max_tokens
+        )
+        available = (
+            self.config.context_length - breakdown.completion_reserved - CONTEXT_SAFETY_MARGIN_TOKENS
+            - breakdown.system - breakdown.history - breakdown.question
+        )
+        breakdown.context_budget = max(0, min(self.config.max_context_tokens, available))
+        return breakdown
+
+    def _make_room_for_context(
+        self, user_input: str, session_id: Optional[str], history: List[Dict[str, str]]
+    ) -> Tuple[List[Dict[str, str]], PromptBreakdown]:
+        """Plans the prompt, dropping the oldest turns while they leave no room for even one excerpt."""
+        breakdown = self._plan_prompt(user_input, history)
+        dropped = 0
+        while breakdown.context_budget < self.config.max_excerpt_tokens and len(history) - dropped > 1:
+            dropped += 1
+            breakdown = self._plan_prompt(user_input, history[:1] + history[1 + dropped:])
+        if dropped:
+            # Retrieved context matters more to the answer than the oldest turns
+            self.sessions.drop_oldest(session_id, dropped)
+            history = self.sessions.snapshot(session_id, compacted=True)
+            breakdown = self._plan_prompt(user_input, history)
+            self.logger.log_info(
+                f"Dropped {dropped} oldest history messages to make room for context "
+                f"(context budget now {breakdown.context_budget} tokens)",
+                {'session_id': session_id}
+            )
+        return history, breakdown
+
+    def _answer_cache_for(self, vector_manager: VectorManager) -> SemanticAnswerCache:
+        if vector_manager is self.vector_manager:
+            return self.answer_cache
+        cache = self._answer_caches.get(vector_manager)
+        if cache is None:
+            cache = self._answer_caches.setdefault(
+                vector_manager, SemanticAnswerCache(self.answer_cache.max_entries, self.answer_cache.threshold)
+            )
+        return cache
+
+    def _prepare_user_turn(
+        self, user_input: str, session_id: Optional[str] = None, timer: Optional[RequestTimer] = None,
+        vector_manager: Optional[VectorManager] = None
+    ) -> PreparedTurn:
+        timer = timer or RequestTimer(self.latency)
+        vector_manager = vector_manager or self.vector_manager
+        index_version = vector_manager.index_version
+        with timer.span('embed'):
+            query_embedding = vector_manager.embed_query(user_input)
+        context_chunks = []
+        if query_embedding is not None:
+            with timer.span('search'):
+                context_chunks = vector_manager.search(user_input, query_embedding=query_embedding)
         self.logger.log_info(f"Found {len(context_chunks)} context chunks (vector)")
         if not context_chunks:
             self.logger.log_info("Trying lexical fallback...")
-            context_chunks = self.vector_manager.search_lexical(user_input)
+            with timer.span('lexical_fallback'):
+                context_chunks = vector_manager.search_lexical(user_input)
 
-        if context_chunks:
-            context = self._build_context_from_chunks(context_chunks, user_input)
-        else:
+        with timer.span('context_build'):
+            # As the model will see it, before this question is appended
+            history, breakdown = self._make_room_for_context(
+                user_input, session_id, self.sessions.snapshot(session_id, compacted=True)
+            )
+            context, citations = '', []
+            if context_chunks:
+                context, breakdown.context, citations = self._build_context_from_chunks(
+                    context_chunks, user_input, breakdown.context_budget, vector_manager
+                )
+        if not context and context_chunks:
+            # Not the same as an empty retrieval: the question alone leaves no room for excerpts
+            context = "Retrieved context omitted: no room left in the model's context window"
+            breakdown.context = self._count_tokens(context)
+            self.logger.log_error(
+                Exception(f"Context budget exhausted ({breakdown.context_budget} tokens); {len(context_chunks)} retrieved chunks dropped"),
+                {'prompt_tokens': breakdown.as_dict(), 'session_id': session_id}
+            )
+        elif not context:
             context = "No relevant context found"
+            breakdown.context = self._count_tokens(context)
 
         augmented_input = f'Relevant Context:{context}\n\nUser Question: {user_input}\n'
-        self._add_to_history('user', augmented_input)
+        # Once this turn is no longer current only the question and what it cited are kept
+        compact_input = f'User Question: {user_input}\n'
+        if citations:
+            compact_input += f"(Context cited: {'; '.join(citations)})\n"
+        user_message = self._add_to_history('user', augmented_input, session_id, compact=compact_input)
+
+        self.last_prompt_breakdown = breakdown
+        self.logger.log_info(
+            f"Prompt tokens: {breakdown.prompt_total} (system {breakdown.system}, history {breakdown.history}, "
+            f"question {breakdown.question}, context {breakdown.context}/{breakdown.context_budget}), "
+            f"completion reserved {breakdown.completion_reserved}",
+            {'prompt_tokens': breakdown.as_dict(), 'session_id': session_id}
+        )
+
+        return PreparedTurn(
+            query_embedding=query_embedding,
+            context_key=SemanticAnswerCache.context_key(context_chunks, history),
+            index_version=index_version,
+            answer_cache=self._answer_cache_for(vector_manager),
+            user_message=user_message
+        )
+
+    def _cached_answer(self, turn: PreparedTurn) -> Optional[str]:
+        answer = turn.answer_cache.lookup(turn.query_embedding, turn.context_key, turn.index_version)
+        if answer is not None:
+            self.logger.log_info("Serving answer from semantic cache")
+        return answer
+
+    def _cache_answer(self, turn: PreparedTurn, answer: str) -> None:
+        # Errors are streamed in-band by the clients and must not be replayed
+        if '\nERROR:' not in answer:
+            turn.answer_cache.store(turn.query_embedding, turn.context_key, turn.index_version, answer)
 
+    @staticmethod
+    def _replay_chunks(answer: str) -> List[str]:
+        return re.findall(r'\S+\s*|\s+', answer)
+
+    def _request_delay(self) -> float:
         current_time = time.time()
-        if current_time - self.last_request_time < self.min_request_interval:
-            time.sleep(self.min_request_interval - (current_time - self.last_request_time))
-        self.last_request_time = time.time()
+        delay = max(0.0, self.min_request_interval - (current_time - self.last_request_time))
+        self.last_request_time = current_time + delay
+        return delay
+
+    def _record_cancellation(self, chunks_received: int) -> None:
+        # An upper bound: the model may have stopped on its own well before max_tokens
+        unspent = max(0, self.config.max_tokens - chunks_received)
+        self.cancelled_generations += 1
+        self.max_tokens_unspent += unspent
+        self.logger.log_info(f"Generation cancelled by client after {chunks_received} chunks (up to {unspent} of max_tokens unspent)")
+
+    def _abandon_turn(self, turn: PreparedTurn, session_id: Optional[str], partial: str) -> None:
+        # A user turn left without a reply would put two user messages in a row, which strict chat templates reject
+        if partial:
+            self._add_to_history('assistant', partial, session_id)
+        else:
+            self.sessions.discard(session_id, turn.user_message)
+
+    def get_generation_stats(self) -> Dict[str, int]:
+        return {
+            'cancelled_generations': self.cancelled_generations,
+            'max_tokens_unspent': self.max_tokens_unspent
+        }
+
+    def _record_first_chunk(
+        self, timer: RequestTimer, generation_started: Optional[float], cached: bool = False
+    ) -> float:
+        now = time.monotonic()
+        # Replayed answers get their own stages so they don't pull the generation histograms down
+        timer.record('cached_ttft' if cached else 'ttft', now - timer.started)
+        if generation_started is not None:
+            timer.record('prefill', now - generation_started)
+        return now
+
+    def _finish_timing(
+        self, timer: RequestTimer, session_id: Optional[str], chunks: int,
+        first_chunk_at: Optional[float], cached: bool = False
+    ) -> None:
+        timer.record('cached_total' if cached else 'total', timer.elapsed())
+        context = {'timings_ms': timer.as_dict(), 'session_id': session_id, 'chunks': chunks, 'answer_cache': cached}
+        if not cached and first_chunk_at is not None and chunks > 1:
+            decode_seconds = time.monotonic() - first_chunk_at
+            if decode_seconds > 0:
+                # Deltas after the first one, over the time they took to arrive
+                tokens_per_second = (chunks - 1) / decode_seconds
+                self.latency.observe('tokens_per_second', tokens_per_second, RATE_BUCKETS)
+                context['tokens_per_second'] = round(tokens_per_second, 1)
+        self.logger.log_info(f"Request timings (ms): {context['timings_ms']}", context)
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, float]]:
+        return self.latency.get_stats()
+
+    def stream_chat(self, user_input: str, session_id: Optional[str] = None, vector_manager: Optional[VectorManager] = None):
+        self.logger.log_info(f"Processing user input (stream): {user_input[:100]}...")
+        timer = RequestTimer(self.latency)
+        turn = self._prepare_user_turn(user_input, session_id, timer, vector_manager)
+
+        cached = self._cached_answer(turn)
+        if cached is not None:
+            chunks = self._replay_chunks(cached)
+            self._record_first_chunk(timer, None, cached=True)
+            sent = 0
+            try:
+                for sent, chunk in enumerate(chunks, start=1):
+                    yield chunk
+            except GeneratorExit:
+                self._abandon_turn(turn, session_id, ''.join(chunks[:sent]))
+                raise
+            self._add_to_history('assistant', cached, session_id)
+            self._finish_timing(timer, session_id, len(chunks), None, cached=True)
+            return
+
+        with timer.span('queue_wait'):
+            delay = self._request_delay()
+            if delay:
+                time.sleep(delay)
 
         full_response_parts = []
+        first_chunk_at = None
+        generation_started = time.monotonic()
+        upstream = self.llm_client.stream_response(
+            messages=self.sessions.snapshot(session_id),
+            model=self.model_id,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens
+        )
         try:
-            for chunk in self.llm_client.stream_response(
-                messages=self.conversation_history,
-                model=self.model_id,
-                temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens
-            ):
+            for chunk in upstream:
+                if first_chunk_at is None:
+                    first_chunk_at = self._record_first_chunk(timer, generation_started)
                 full_response_parts.append(chunk)
                 yield chunk
 
             full = ''.join(full_response_parts)
-            self._add_to_history('assistant', full)
-            self._trim_history()
+            self._add_to_history('assistant', full, session_id)
+            self._cache_answer(turn, full)
+        except GeneratorExit:
+            self._record_cancellation(len(full_response_parts))
+            self._abandon_turn(turn, session_id, ''.join(full_response_parts))
+            raise
         except (requests.exceptions.RequestException, Exception) as e:
             self.logger.log_error(e)
+            self._abandon_turn(turn, session_id, ''.join(full_response_parts))
             yield f"\nERROR: {str(e)}"
+        finally:
+            # Closing the upstream generator closes its HTTP stream right away
+            upstream.close()
+            self._finish_timing(timer, session_id, len(full_response_parts), first_chunk_at)
+
+    async def astream_chat(
+        self, user_input: str, session_id: Optional[str] = None, vector_manager: Optional[VectorManager] = None
+    ) -> AsyncGenerator[str, None]:
+        self.logger.log_info(f"Processing user input (async stream): {user_input[:100]}...")
+        timer = RequestTimer(self.latency)
+        # Retrieval is CPU and blocking HTTP work; generation below stays on the event loop
+        prepare = asyncio.ensure_future(
+            asyncio.to_thread(self._prepare_user_turn, user_input, session_id, timer, vector_manager)
+        )
+        try:
+            turn = await asyncio.shield(prepare)
+        except asyncio.CancelledError:
+            # The thread runs on and adds the question to history; wait for it so the turn can be taken back out
+            turn = await prepare
+            self._record_cancellation(0)
+            self._abandon_turn(turn, session_id, '')
+            raise
 
-    def _build_context_from_chunks(self, context_chunks, user_input: str) -> str:
+        cached = self._cached_answer(turn)
+        if cached is not None:
+            chunks = self._replay_chunks(cached)
+            self._record_first_chunk(timer, None, cached=True)
+            sent = 0
+            try:
+                for sent, chunk in enumerate(chunks, start=1):
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                self._abandon_turn(turn, session_id, ''.join(chunks[:sent]))
+                raise
+            self._add_to_history('assistant', cached, session_id)
+            self._finish_timing(timer, session_id, len(chunks), None, cached=True)
+            return
+
+        full_response_parts = []
+        first_chunk_at = None
+        upstream = None
+        try:
+            queued_at = time.monotonic()
+            # The scheduler replaces the fixed request interval on this path
+            async with self.scheduler.slot(session_id):
+                generation_started = time.monotonic()
+                timer.record('queue_wait', generation_started - queued_at)
+                upstream = self.llm_client.astream_response(
+                    messages=self.sessions.snapshot(session_id),
+                    model=self.model_id,
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens
+                )
+                async for chunk in upstream:
+                    if first_chunk_at is None:
+                        first_chunk_at = self._record_first_chunk(timer, generation_started)
+                    full_response_parts.append(chunk)
+                    yield chunk
+
+            full = ''.join(full_response_parts)
+            self._add_to_history('assistant', full, session_id)
+            self._cache_answer(turn, full)
+        except (asyncio.CancelledError, GeneratorExit):
+            self._record_cancellation(len(full_response_parts))
+            self._abandon_turn(turn, session_id, ''.join(full_response_parts))
+            raise
+        except Exception as e:
+            self.logger.log_error(e)
+            self._abandon_turn(turn, session_id, ''.join(full_response_parts))
+            yield f"\nERROR: {str(e)}"
+        finally:
+            if upstream is not None:
+                await upstream.aclose()
+            self._finish_timing(timer, session_id, len(full_response_parts), first_chunk_at)
+
+    def _build_context_from_chunks(
+        self, context_chunks, user_input: str, token_budget: Optional[int] = None,
+        vector_manager: Optional[VectorManager] = None
+    ) -> Tuple[str, int, List[str]]:
+        vector_manager = vector_manager or self.vector_manager
         document_ids = [pid.upper() for pid in re.findall(r'(CN\d+[A-Z]?)', user_input, re.IGNORECASE)]
 
         if document_ids:
-            prioritized = [c for c in context_chunks if any(pid in c[2].upper() for pid in document_ids)]
-            remainder = [c for c in context_chunks if c not in prioritized]
-            ordered = prioritized + remainder
+            prioritized = {
+                i for i, c in enumerate(context_chunks)
+                if any(pid in c[2].upper() for pid in document_ids)
+            }
+            ordered = (
+                [c for i, c in enumerate(context_chunks) if i in prioritized]
+                + [c for i, c in enumerate(context_chunks) if i not in prioritized]
+            )
         else:
             ordered = context_chunks
 
@@ -173,56 +591,44 @@ class Chat:
             seen.add(key)
             deduped.append((text, similarity, source, chunk_idx))
 
-        max_chars = 12000
-        per_chunk_limit = 700
-        max_chunks = 12
+        if token_budget is None:
+            token_budget = self.config.max_context_tokens
+        max_excerpt_tokens = self.config.max_excerpt_tokens
+        # Sentence selection works on characters; ~4 characters per token leaves room for the token trim below
+        per_chunk_limit = max_excerpt_tokens * 4
 
-        query_tokens = set(t.lower() for t in re.findall(r'[A-Za-z0-9]+', user_input) if len(t) > 3)
+        terms = query_terms(user_input)
 
         parts = []
+        citations = []
         used = 0
         for text, similarity, source, chunk_idx in deduped:
-            excerpt = self._extract_relevant_excerpt(text, query_tokens, per_chunk_limit)
+            sentence_index = vector_manager.sentence_index(text)
+            excerpt = sentence_index.excerpt(text, terms, per_chunk_limit)
             if not excerpt:
                 excerpt = text[:per_chunk_limit]
 
+            excerpt_tokens = self.encoding.encode_ordinary(excerpt)
+            if len(excerpt_tokens) > max_excerpt_tokens:
+                excerpt_tokens = excerpt_tokens[:max_excerpt_tokens]
+                excerpt = self.encoding.decode(excerpt_tokens)
+
             clean_source = self._clean_source_name(source)
             confidence_level = "HIGH" if similarity >= 0.85 else "MEDIUM" if similarity >= 0.70 else "LOW"
-            part = f'[{clean_source}, Section {chunk_idx + 1} - Confidence {confidence_level} ({similarity:.2f})]: {excerpt}'
+            header = f'[{clean_source}, Section {chunk_idx + 1} - Confidence {confidence_level} ({similarity:.2f})]: '
+            # The separator between parts costs one token
+            part_tokens = self._count_tokens(header) + len(excerpt_tokens) + 1
 
-            if used + len(part) > max_chars:
+            if used + part_tokens > token_budget:
                 break
-            parts.append(part)
-            used += len(part) + 2
-            if len(parts) >= max_chunks:
+            parts.append(header + excerpt)
+            citations.append(f'{clean_source}, Section {chunk_idx + 1}')
+            used += part_tokens
+            if len(parts) >= MAX_CONTEXT_CHUNKS:
                 break
 
-        return '\n\n'.join(parts)
-
-    def _extract_relevant_excerpt(self, text: str, query_tokens: set, limit: int) -> str:
-        sentences = re.split(r'(?<=[\.!?;])\s+', text)
-        scored = []
-        for s in sentences:
-            lower = s.lower()
-            score = 0
-            for t in query_tokens:
-                if t in lower:
-                    score += 1
-            score += lower.count('%')
-            if score > 0:
-                scored.append((score, s))
-
-        if not scored:
-            return ''
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-        excerpt = ''
-        for _, s in scored:
-            if len(excerpt) + len(s) + 1 > limit:
-                break
-            excerpt = (excerpt + ' ' + s).strip()
-        return excerpt[:limit]
-    
+        return '\n\n'.join(parts), used, citations
+
     def _clean_source_name(self, source: str) -> str:
         if os.path.sep in source:
             source = os.path.basename(source)
@@ -233,12 +639,7 @@ class Chat:
         
         return source
     
-    def _add_to_history(self, role: str, content: str) -> None:
-        self.conversation_history.append({'role': role, 'content': content})
-    
-    def _trim_history(self) -> None:
-        max_history = self.config.max_history_length
-        if len(self.conversation_history) > max_history + 1:
-            system_message = self.conversation_history[0]
-            recent_messages = self.conversation_history[-max_history:]
-            self.conversation_history = [system_message] + recent_messages
\ No newline at end of file
+    def _add_to_history(
+        self, role: str, content: str, session_id: Optional[str] = None, compact: Optional[str] = None
+    ) -> Dict[str, str]:
+        return self.sessions.append(session_id, role, content, compact=compact)
@@ -4,7 +4,9 @@ from typing import List, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 from app.exceptions import APIRequestError, EmbeddingGenerationError
+from app.src.utils.latency import LatencyRecorder
 from app.src.utils.logging_manager import LoggingManager
+from app.src.utils.metrics import COUNT_BUCKETS
 from constants import DEFAULT_TIMEOUT, MAX_RETRY_ATTEMPTS, MIN_REQUEST_INTERVAL
 
 class EmbeddingGenerator:
@@ -16,6 +18,22 @@ class EmbeddingGenerator:
         self.min_request_interval = MIN_REQUEST_INTERVAL
         self.model_id = model_id
         self.logger = logger or LoggingManager()
+        self.latency = LatencyRecorder()
+
+    def for_model(self, model_id: str) -> 'EmbeddingGenerator':
+        """A generator for another model on the same endpoint, e.g. the one an existing index was built with."""
+        if model_id == self.model_id:
+            return self
+        generator = EmbeddingGenerator(self.url, self.timeout, self.batch_size, model_id, self.logger)
+        generator.latency = self.latency
+        return generator
+
+    def generate_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        if not texts:
+            return None
+        # Observed once per batch, outside the retried request
+        self.latency.observe('batch_size', len(texts), COUNT_BUCKETS)
+        return self._request_embeddings(texts)
 
     @retry(
         stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
@@ -23,10 +41,7 @@ class EmbeddingGenerator:
         retry=retry_if_exception_type(requests.exceptions.RequestException),
         retry_error_callback=lambda retry_state: None
     )
-    def generate_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
-        if not texts:
-            return None
-            
+    def _request_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
         current_time = time.time()
         elapsed = current_time - self.last_request_time
         if elapsed < self.min_request_interval:
@@ -39,15 +54,16 @@ class EmbeddingGenerator:
         }
         
         try:
-            response = requests.post(
-                self.url,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json'
-                },
-                json=payload,
-                timeout=self.timeout * 2 
-            )
+            with self.latency.time('request'):
+                response = requests.post(
+                    self.url,
+                    headers={
+                        'Content-Type': 'application/json',
+                        'Accept': 'application/json'
+                    },
+                    json=payload,
+                    timeout=self.timeout * 2
+                )
             
             if response.status_code == 404:
                 raise APIRequestError(f"Embedding endpoint not found at {self.url}")
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional
+
+from constants import DEFAULT_SESSION_ID, LLM_MAX_CONCURRENCY
+
+@dataclass
+class _Ticket:
+    session_id: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class LLMScheduler:
+    """Caps concurrent LLM generations and grants slots round-robin across sessions.
+
+    All state is touched only from the event loop, so no locks are needed. Cancelling a
+    waiting task (e.g. when its HTTP client disconnects) removes it from the queue. The cap
+    is per process: with several workers the backend sees up to workers x max_concurrency.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._queues: 'OrderedDict[str, deque[_Ticket]]' = OrderedDict()
+        self._queued = 0
+
+        self.granted = 0
+        self.cancelled = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _grant(self, ticket: _Ticket) -> None:
+        wait = time.monotonic() - ticket.enqueued_at
+        self._active += 1
+        self.granted += 1
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        ticket.future.set_result(None)
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self._queued -= 1
+            if queue:
+                # Rotate so the next slot goes to the next session in line
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            if not ticket.future.done():
+                self._grant(ticket)
+
+    def _dequeue(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.session_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            return
+        self._queued -= 1
+        if not queue:
+            del self._queues[ticket.session_id]
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        session_id = session_id or DEFAULT_SESSION_ID
+        ticket = _Ticket(session_id=session_id, future=asyncio.get_running_loop().create_future())
+
+        if self._active < self.max_concurrency and not self._queued:
+            self._grant(ticket)
+        else:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self._queued += 1
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket.future.done() and not ticket.future.cancelled():
+                    # Granted just before the cancellation landed: hand the slot on
+                    self._release()
+                else:
+                    ticket.future.cancel()
+                    self._dequeue(ticket)
+                self.cancelled += 1
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'active': self._active,
+            'queue_depth': self._queued,
+            'queued_sessions': len(self._queues),
+            'granted': self.granted,
+            'cancelled': self.cancelled,
+            'avg_wait_seconds': self.total_wait_seconds / self.granted if self.granted else 0.0,
+            'max_wait_seconds': self.max_wait_seconds
+        }
@@ -0,0 +1,229 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from constants import (
+    DEFAULT_SESSION_ID, HISTORY_SUMMARY_MAX_CHARS, MAX_HISTORY_LENGTH, MAX_HISTORY_TOKENS,
+    MAX_SESSION_CHARS, MAX_SESSIONS, MAX_TOTAL_SESSION_CHARS, SESSION_TTL_SECONDS
+)
+
+SUMMARY_HEADER = "\n\nSummary of the earlier conversation:\n"
+
+
+@dataclass
+class Session:
+    session_id: str
+    history: List[Dict[str, str]]
+    last_access: float = field(default_factory=time.monotonic)
+    size_chars: int = 0
+    size_tokens: int = 0
+    summary: str = ''
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+class SessionStore:
+    """Conversation histories keyed by session ID, bounded per session and globally.
+
+    The store lock only guards the LRU map and the global size counter; each session has
+    its own lock for history mutations, so concurrent chats in different sessions never
+    wait on each other for more than a dictionary operation.
+    """
+
+    def __init__(
+        self,
+        system_message: str,
+        max_history_length: int = MAX_HISTORY_LENGTH,
+        max_sessions: int = MAX_SESSIONS,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_session_chars: int = MAX_SESSION_CHARS,
+        max_total_chars: int = MAX_TOTAL_SESSION_CHARS,
+        max_history_tokens: int = MAX_HISTORY_TOKENS,
+        summary_mode: bool = False,
+        token_counter: Optional[Callable[[str], int]] = None
+    ):
+        self.system_message = system_message
+        self.max_history_length = max_history_length
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_session_chars = max_session_chars
+        self.max_total_chars = max_total_chars
+        self.max_history_tokens = max_history_tokens
+        self.summary_mode = summary_mode
+        self.token_counter = token_counter
+
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_chars = 0
+        self.evictions = 0
+
+    def _new_session(self, session_id: str) -> Session:
+        history = [{'role': 'system', 'content': self.system_message}]
+        return Session(session_id=session_id, history=history, size_chars=len(self.system_message))
+
+    def _evict_locked(self, now: float, keep: Optional[str] = None) -> None:
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            # The session being served is most recently used, so reaching it means nothing else is left
+            if oldest_id == keep:
+                break
+            expired = now - oldest.last_access > self.ttl_seconds
+            over_budget = len(self._sessions) > self.max_sessions or self._total_chars > self.max_total_chars
+            if not expired and not over_budget:
+                break
+            del self._sessions[oldest_id]
+            self._total_chars -= oldest.size_chars
+            self.evictions += 1
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        session_id = session_id or DEFAULT_SESSION_ID
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or now - session.last_access > self.ttl_seconds:
+                if session is not None:
+                    self._total_chars -= session.size_chars
+                session = self._new_session(session_id)
+                self._sessions[session_id] = session
+                self._total_chars += session.size_chars
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_access = now
+            self._evict_locked(now, keep=session_id)
+        return session
+
+    def _apply_size_delta(self, session: Session, delta: int) -> None:
+        with self._lock:
+            # An evicted session already had its final size subtracted
+            if self._sessions.get(session.session_id) is session:
+                self._total_chars += delta
+                self._evict_locked(time.monotonic(), keep=session.session_id)
+
+    def _count_tokens(self, text: str) -> int:
+        return self.token_counter(text) if self.token_counter else len(text) // 4
+
+    def snapshot(self, session_id: Optional[str] = None, compacted: bool = False) -> List[Dict[str, str]]:
+        """Returns the history as sent to the model; `compacted` shows it as the next user turn will see it."""
+        session = self.get(session_id)
+        with session.lock:
+            messages = [
+                {'role': m['role'], 'content': m.get('compact', m['content']) if compacted else m['content']}
+                for m in session.history
+            ]
+            summary = session.summary
+        if summary:
+            # Folded into the system prompt: several chat templates reject a second system message
+            messages[0] = {'role': 'system', 'content': messages[0]['content'] + SUMMARY_HEADER + summary}
+        return messages
+
+    def append(self, session_id: Optional[str], role: str, content: str, compact: Optional[str] = None) -> Dict[str, str]:
+        """Appends a message and returns it; `compact` replaces its content once a newer user turn arrives."""
+        session = self.get(session_id)
+        with session.lock:
+            before = session.size_chars
+            if role == 'user':
+                for message in session.history[1:]:
+                    if 'compact' in message:
+                        message['content'] = message.pop('compact')
+            message = {'role': role, 'content': content}
+            if compact is not None:
+                message['compact'] = compact
+            session.history.append(message)
+            self._trim_locked(session)
+            delta = session.size_chars - before
+        self._apply_size_delta(session, delta)
+        return message
+
+    def discard(self, session_id: Optional[str], message: Dict[str, str]) -> bool:
+        """Removes a message returned by `append`, if it is still in the history."""
+        session = self.get(session_id)
+        with session.lock:
+            for position in range(len(session.history) - 1, 0, -1):
+                if session.history[position] is message:
+                    del session.history[position]
+                    session.size_chars -= len(message['content'])
+                    session.size_tokens -= self._count_tokens(message.get('compact', message['content']))
+                    break
+            else:
+                return False
+        self._apply_size_delta(session, -len(message['content']))
+        return True
+
+    def drop_oldest(self, session_id: Optional[str], count: int) -> None:
+        """Drops the oldest `count` messages, e.g. when they leave no room for retrieved context."""
+        session = self.get(session_id)
+        with session.lock:
+            before = session.size_chars
+            dropped = session.history[1:1 + count]
+            del session.history[1:1 + count]
+            if self.summary_mode and dropped:
+                session.summary = self._fold_summary(session.summary, dropped)
+            self._trim_locked(session)
+            delta = session.size_chars - before
+        self._apply_size_delta(session, delta)
+
+    def replace_history(self, session_id: Optional[str], history: List[Dict[str, str]]) -> None:
+        session = self.get(session_id)
+        with session.lock:
+            before = session.size_chars
+            session.history = list(history)
+            self._trim_locked(session)
+            delta = session.size_chars - before
+        self._apply_size_delta(session, delta)
+
+    def _trim_locked(self, session: Session) -> None:
+        system_message, messages = session.history[0], session.history[1:]
+        dropped = []
+        if len(messages) > self.max_history_length:
+            dropped = messages[:-self.max_history_length]
+            messages = messages[-self.max_history_length:]
+
+        # The token bound covers what later turns carry forward, so the current turn counts at its compact size
+        size = len(system_message['content']) + sum(len(m['content']) for m in messages)
+        tokens = sum(self._count_tokens(m.get('compact', m['content'])) for m in messages)
+        while len(messages) > 1 and (size > self.max_session_chars or tokens > self.max_history_tokens):
+            message = messages.pop(0)
+            dropped.append(message)
+            size -= len(message['content'])
+            tokens -= self._count_tokens(message.get('compact', message['content']))
+
+        if self.summary_mode and dropped:
+            session.summary = self._fold_summary(session.summary, dropped)
+
+        session.history = [system_message] + messages
+        session.size_chars = size + len(session.summary)
+        session.size_tokens = tokens + (self._count_tokens(session.summary) if session.summary else 0)
+
+    @staticmethod
+    def _fold_summary(summary: str, dropped: List[Dict[str, str]]) -> str:
+        lines = summary.splitlines() if summary else []
+        for message in dropped:
+            content = message.get('compact', message['content'])
+            if message['role'] == 'user':
+                question = content.split('User Question:', 1)[-1].strip().splitlines()
+                lines.append(f"- Q: {question[0] if question else ''}")
+            elif message['role'] == 'assistant':
+                first_sentence = re.split(r'(?<=[\.!?])\s+', content.strip(), maxsplit=1)[0]
+                lines.append(f"  A: {first_sentence[:200]}")
+
+        # Rolling: the oldest lines fall off first
+        while lines and sum(len(line) + 1 for line in lines) > HISTORY_SUMMARY_MAX_CHARS:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def reset(self, session_id: Optional[str] = None) -> None:
+        session_id = session_id or DEFAULT_SESSION_ID
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_chars -= session.size_chars
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'total_chars': self._total_chars,
+                'total_tokens': sum(session.size_tokens for session in self._sessions.values()),
+                'evictions': self.evictions
+            }
@@ -0,0 +1,118 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+RATE_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+class Histogram:
+    """Fixed-bucket histogram; observing is a bisect plus a few increments under a short lock."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[position] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Per-bucket counts (the last one is +Inf), sum and count."""
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def quantile(self, q: float) -> float:
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for position, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                # Upper bound of the bucket, never above the largest value actually observed
+                return min(self.buckets[position], self._max) if position < len(self.buckets) else self._max
+        return self._max
+
+    def get_stats(self) -> Dict[str, float]:
+        _, total, count = self.snapshot()
+        return {
+            'count': count,
+            'mean': total / count if count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self._max
+        }
+
+class LatencyRecorder:
+    """Named histograms, created on first observation."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(buckets))
+        return histogram
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.histogram(name, buckets).observe(value)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def items(self) -> List[Tuple[str, Histogram]]:
+        with self._lock:
+            return list(self._histograms.items())
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: histogram.get_stats() for name, histogram in self.items()}
+
+class RequestTimer:
+    """Monotonic stage spans of one request, also fed into a shared recorder."""
+
+    def __init__(self, recorder: Optional[LatencyRecorder] = None):
+        self.recorder = recorder
+        self.started = time.monotonic()
+        self.spans: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        if self.recorder is not None:
+            self.recorder.observe(stage, seconds)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - start)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.spans.items()}
@@ -0,0 +1,151 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.src.utils.latency import Histogram, LatencyRecorder
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+COUNT_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+Labels = Dict[str, str]
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class PrometheusWriter:
+    """Builds a scrape in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lines: List[str] = []
+
+    def _header(self, name: str, kind: str, help_text: str) -> None:
+        self._lines.append(f'# HELP {name} {help_text}')
+        self._lines.append(f'# TYPE {name} {kind}')
+
+    def _samples(self, name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> None:
+        self._header(name, kind, help_text)
+        for labels, value in samples:
+            self._lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def counter(self, name: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> None:
+        self._samples(name, 'counter', help_text, samples)
+
+    def gauge(self, name: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> None:
+        self._samples(name, 'gauge', help_text, samples)
+
+    def histogram(self, name: str, help_text: str, series: Iterable[Tuple[Labels, Histogram]]) -> None:
+        self._header(name, 'histogram', help_text)
+        for labels, histogram in series:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = ('le', _format_value(float(bound)) if bound != float('inf') else '+Inf')
+                self._lines.append(f'{name}_bucket{_format_labels(labels, le)} {cumulative}')
+            self._lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            self._lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    def recorder(self, name: str, help_text: str, recorder: LatencyRecorder, label: str,
+                 include: Optional[Callable[[str], bool]] = None) -> None:
+        """One histogram family with a label per recorder entry."""
+        self.histogram(name, help_text, (
+            ({label: key}, histogram) for key, histogram in recorder.items()
+            if include is None or include(key)
+        ))
+
+    def render(self) -> str:
+        return '\n'.join(self._lines) + '\n'
+
+class RequestMetrics:
+    """Per-endpoint request counts and latencies, plus the number of open response streams.
+
+    Counter increments take one short lock; `active_streams` is only touched from the event loop.
+    """
+
+    def __init__(self):
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+        self.latency = LatencyRecorder()
+        self.active_streams = 0
+
+    def observe(self, method: str, endpoint: str, status: int, seconds: float) -> None:
+        key = (method, endpoint, str(status))
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+        self.latency.observe(endpoint, seconds)
+
+    def write(self, writer: PrometheusWriter) -> None:
+        with self._lock:
+            requests = list(self._requests.items())
+        writer.counter('http_requests_total', 'HTTP requests by method, endpoint and status.', (
+            ({'method': method, 'endpoint': endpoint, 'status': status}, count)
+            for (method, endpoint, status), count in requests
+        ))
+        writer.recorder(
+            'http_request_duration_seconds', 'HTTP request latency until the last body byte is sent.',
+            self.latency, 'endpoint'
+        )
+        writer.gauge('http_active_streams', 'Streaming responses currently open.', [({}, self.active_streams)])
+
+class RequestMetricsMiddleware:
+    """ASGI middleware feeding RequestMetrics; streamed responses are timed until their body ends."""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+        self._route_paths: Dict[Any, str] = {}
+
+    def _endpoint_label(self, scope) -> str:
+        # Route templates instead of raw paths keep label cardinality bounded
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            router = scope.get('router')
+            for route in getattr(router, 'routes', []):
+                if getattr(route, 'endpoint', None) is endpoint:
+                    path = route.path
+                    break
+            path = path or getattr(endpoint, '__name__', 'unknown')
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        status = 500
+        recorded = False
+
+        def record() -> None:
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                self.metrics.observe(scope['method'], self._endpoint_label(scope), status, time.monotonic() - start)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
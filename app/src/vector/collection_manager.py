@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from constants import COLLECTION_CACHE_FILE, COLLECTION_DOCUMENTS_DIRECTORY, DEFAULT_COLLECTION
+from app.src.vector.vector_manager import VectorManager
+from app.src.utils.logging_manager import LoggingManager
+
+COLLECTION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+@dataclass(frozen=True)
+class Collection:
+    name: str
+    documents_directory: str
+    cache_file: str
+
+def discover_collections(root: str) -> Dict[str, Collection]:
+    """One collection per subdirectory of `root`, each with its own documents folder and cache."""
+    if not root or not os.path.isdir(root):
+        return {}
+    collections = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and COLLECTION_NAME.match(name) and name != DEFAULT_COLLECTION:
+            collections[name] = Collection(
+                name=name,
+                documents_directory=os.path.join(path, COLLECTION_DOCUMENTS_DIRECTORY),
+                cache_file=os.path.join(path, COLLECTION_CACHE_FILE)
+            )
+    return collections
+
+@dataclass
+class LoadedCollection:
+    collection: Collection
+    vector_manager: VectorManager
+    ingest_queue: Any = None
+    ingest_spool: Any = None
+    compaction: Any = None
+    document_watcher: Any = None
+    reembedding: Any = None
+
+    @property
+    def busy(self) -> bool:
+        # Evicting would cancel ingestion half way; it resumes from the checkpoint, but only when reloaded
+        if self.reembedding is not None and self.reembedding.running:
+            return True
+        return self.ingest_queue is not None and self.ingest_queue.active_jobs() > 0
+
+    def close(self) -> None:
+        if self.reembedding is not None:
+            self.reembedding.stop()
+        if self.document_watcher is not None:
+            self.document_watcher.stop()
+        if self.ingest_spool is not None:
+            self.ingest_spool.stop()
+        if self.ingest_queue is not None:
+            self.ingest_queue.close()
+        if self.compaction is not None:
+            self.compaction.stop()
+        self.vector_manager.close()
+
+class UnknownCollection(KeyError):
+    pass
+
+class CollectionManager:
+    """Named corpora loaded on first use and evicted least-recently-used under a memory budget.
+
+    The default collection is pinned. An evicted collection is only dropped from the map: a
+    request that already holds its vector manager finishes against the snapshot it has.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        load: Callable[[Collection], LoadedCollection],
+        memory_budget: int,
+        default: Optional[LoadedCollection] = None,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.root = root
+        self.load = load
+        self.memory_budget = memory_budget
+        self.logger = logger or LoggingManager()
+
+        self._collections = discover_collections(root)
+        self._loaded: 'OrderedDict[str, LoadedCollection]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Loads are serialized so two requests for a cold collection read its cache once
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        if default is not None:
+            self._loaded[DEFAULT_COLLECTION] = default
+
+    def get(self, name: Optional[str] = None) -> LoadedCollection:
+        name = name or DEFAULT_COLLECTION
+        with self._lock:
+            loaded = self._loaded.get(name)
+            if loaded is not None:
+                self._loaded.move_to_end(name)
+                return loaded
+
+        with self._load_lock:
+            with self._lock:
+                loaded = self._loaded.get(name)
+                if loaded is not None:
+                    return loaded
+                collection = self._collections.get(name)
+            if collection is None:
+                # Folders created after startup become collections on first request
+                self._collections = discover_collections(self.root)
+                collection = self._collections.get(name)
+                if collection is None:
+                    raise UnknownCollection(name)
+
+            self.logger.log_info(f"Loading collection '{name}' from {collection.cache_file}")
+            loaded = self.load(collection)
+            with self._lock:
+                self._loaded[name] = loaded
+                self.loads += 1
+                evicted = self._select_evictions_locked(keep=name)
+
+        for victim in evicted:
+            self.logger.log_info(f"Evicting collection '{victim.collection.name}' to stay within the memory budget")
+            victim.close()
+        return loaded
+
+    def _select_evictions_locked(self, keep: str) -> List[LoadedCollection]:
+        sizes = {name: loaded.vector_manager.memory_bytes() for name, loaded in self._loaded.items()}
+        total = sum(sizes.values())
+        evicted = []
+        for name in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            loaded = self._loaded[name]
+            if name in (keep, DEFAULT_COLLECTION) or loaded.busy:
+                continue
+            del self._loaded[name]
+            total -= sizes[name]
+            self.evictions += 1
+            evicted.append(loaded)
+        return evicted
+
+    def loaded(self) -> List[LoadedCollection]:
+        with self._lock:
+            return list(self._loaded.values())
+
+    def close(self) -> None:
+        with self._lock:
+            loaded = list(self._loaded.values())
+            self._loaded.clear()
+        for collection in loaded:
+            collection.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = list(self._loaded.items())
+            available = set(self._collections)
+        return {
+            'available': sorted(available | {DEFAULT_COLLECTION}),
+            'loaded': {name: c.vector_manager.memory_bytes() for name, c in loaded},
+            'memory_budget_bytes': self.memory_budget,
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,62 @@
+import threading
+from typing import Any, Dict, Optional
+
+from constants import COMPACTION_DEAD_FRACTION, COMPACTION_INTERVAL_SECONDS
+from app.src.utils.logging_manager import LoggingManager
+
+class CompactionWorker:
+    """Background upkeep of the vector cache: persists tombstones, and compacts once too many rows are dead.
+
+    Deletes only mask rows in the live snapshot; this thread is what eventually writes them to disk
+    and, past `dead_fraction`, drops the dead rows and rebuilds the index in one pass.
+    """
+
+    def __init__(
+        self,
+        vector_manager,
+        dead_fraction: float = COMPACTION_DEAD_FRACTION,
+        interval: float = COMPACTION_INTERVAL_SECONDS,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.vector_manager = vector_manager
+        self.dead_fraction = dead_fraction
+        self.interval = interval
+        self.logger = logger or LoggingManager()
+        self.compactions = 0
+        self.rows_dropped = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='index-compaction', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> int:
+        if self.vector_manager.dead_fraction() < self.dead_fraction:
+            self.vector_manager.flush()
+            return 0
+        dropped = self.vector_manager.compact()
+        if dropped:
+            self.compactions += 1
+            self.rows_dropped += dropped
+        return dropped
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.log_error(e, {'message': 'Index compaction failed'})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'dead_fraction': round(self.vector_manager.dead_fraction(), 4),
+            'threshold': self.dead_fraction,
+            'compactions': self.compactions,
+            'rows_dropped': self.rows_dropped
+        }
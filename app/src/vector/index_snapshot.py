@@ -0,0 +1,212 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+class IndexView(ABC):
+    """Read-only rows of an index: chunk metadata plus a row-normalized float32 matrix."""
+
+    version: int = 0
+    matrix: np.ndarray
+    # Physical rows masked out of every search, or None when nothing has been deleted
+    dead_rows: Optional[np.ndarray] = None
+    # Model ID and dimension the rows were embedded with; queries must be embedded by the same model
+    embedding_model: Optional[Dict[str, Any]] = None
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Live rows."""
+
+    def live_rows(self) -> Iterable[int]:
+        return range(len(self))
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def sources(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def text(self, row: int) -> str:
+        pass
+
+    @abstractmethod
+    def source(self, row: int) -> str:
+        pass
+
+    @abstractmethod
+    def chunk_idx(self, row: int) -> int:
+        pass
+
+    @abstractmethod
+    def rows_for_sources(self, matches: Callable[[str], bool]) -> np.ndarray:
+        pass
+
+    def sentence_index_data(self, text: str) -> Optional[Dict]:
+        return None
+
+    def result(self, row: int, similarity: float) -> Tuple[str, float, str, int]:
+        return self.text(row), similarity, self.source(row), self.chunk_idx(row)
+
+    def nearest(
+        self, query: np.ndarray, k: int, min_similarity: float, rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Top-k rows by cosine similarity; stored rows are already normalized."""
+        return self.nearest_batch(np.asarray(query).reshape(1, -1), k, min_similarity, rows)[0]
+
+    def nearest_batch(
+        self, queries: np.ndarray, k: int, min_similarity: float, rows: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k rows for every query row, scored in a single matrix product."""
+        queries = np.asarray(queries, dtype=np.float32)
+        empty: List[List[Tuple[int, float]]] = [[] for _ in range(len(queries))]
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        if not len(self) or not len(matrix) or k <= 0:
+            return empty
+        if queries.shape[1] != matrix.shape[1]:
+            # Embedded by another model, e.g. across a model swap: nothing in this index is comparable
+            return empty
+
+        norms = np.linalg.norm(queries, axis=1)
+        valid = norms > 0
+        sims = matrix @ (queries[valid] / norms[valid, None]).T
+        if rows is None and self.dead_rows is not None:
+            # Tombstoned rows can never pass min_similarity, so they drop out below
+            sims[self.dead_rows] = -np.inf
+        k = min(k, len(matrix))
+        if k < len(matrix):
+            top = np.argpartition(-sims, k - 1, axis=0)[:k]
+        else:
+            top = np.broadcast_to(np.arange(len(matrix))[:, None], sims.shape)
+
+        results = empty
+        for column, query_position in enumerate(np.flatnonzero(valid)):
+            candidates = top[:, column]
+            scores = sims[candidates, column]
+            order = np.argsort(-scores, kind='stable')
+            candidates, scores = candidates[order], scores[order]
+            row_ids = candidates if rows is None else rows[candidates]
+            results[query_position] = [
+                (int(row), float(score)) for row, score in zip(row_ids, scores) if score >= min_similarity
+            ]
+        return results
+
+def normalize_rows(embeddings: Sequence[np.ndarray]) -> np.ndarray:
+    if not len(embeddings):
+        return np.zeros((0, 0), dtype=np.float32)
+    matrix = np.vstack(embeddings).astype(np.float32, copy=False)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class IndexSnapshot(IndexView):
+    """Immutable in-memory index at one version.
+
+    The writer never mutates a published snapshot: it builds the next one from its own
+    lists and swaps the reference, so a search that grabbed a snapshot sees aligned chunks
+    and embeddings for its whole duration without taking a lock.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        chunks: Sequence[Dict],
+        matrix: np.ndarray,
+        dead_rows: Optional[Iterable[int]] = None,
+        embedding_model: Optional[Dict[str, Any]] = None
+    ):
+        self.version = version
+        self.embedding_model = embedding_model
+        self.chunks: Tuple[Dict, ...] = tuple(chunks)
+        matrix.setflags(write=False)
+        self.matrix = matrix
+        dead = np.unique(np.fromiter(dead_rows, dtype=np.int64)) if dead_rows is not None else np.zeros(0, dtype=np.int64)
+        self.dead_rows = dead[dead < len(self.chunks)] if len(dead) else None
+        self._source_rows: Optional[Dict[str, np.ndarray]] = None
+        self._sentence_indexes: Optional[Dict[str, Dict]] = None
+
+    @classmethod
+    def build(
+        cls,
+        version: int,
+        chunks: Sequence[Dict],
+        embeddings: Sequence[np.ndarray],
+        dead_rows: Optional[Iterable[int]] = None,
+        embedding_model: Optional[Dict[str, Any]] = None
+    ) -> 'IndexSnapshot':
+        return cls(version, chunks, normalize_rows(embeddings), dead_rows, embedding_model)
+
+    def with_deleted(self, version: int, rows: Iterable[int]) -> 'IndexSnapshot':
+        """The same rows and matrix with more rows tombstoned; no copy of the embeddings."""
+        dead = self.dead_rows.tolist() if self.dead_rows is not None else []
+        # tuple() of a tuple is the same object, so the chunk metadata is shared as well
+        snapshot = IndexSnapshot(version, self.chunks, self.matrix, dead + list(rows), self.embedding_model)
+        # Spans are keyed by the text they describe, so entries of the newly dead rows are merely unused
+        snapshot._sentence_indexes = self._sentence_indexes
+        return snapshot
+
+    @classmethod
+    def empty(cls, version: int = 0) -> 'IndexSnapshot':
+        return cls(version, (), np.zeros((0, 0), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.chunks) - (len(self.dead_rows) if self.dead_rows is not None else 0)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    def live_rows(self) -> Iterable[int]:
+        if self.dead_rows is None:
+            return range(len(self.chunks))
+        live = np.ones(len(self.chunks), dtype=bool)
+        live[self.dead_rows] = False
+        return np.flatnonzero(live).tolist()
+
+    def live_chunks_and_matrix(self) -> Tuple[Sequence[Dict], np.ndarray]:
+        if self.dead_rows is None:
+            return self.chunks, self.matrix
+        rows = self.live_rows()
+        return [self.chunks[row] for row in rows], self.matrix[rows]
+
+    def _rows_by_source(self) -> Dict[str, np.ndarray]:
+        # Built on first use; a benign race at worst computes it twice
+        if self._source_rows is None:
+            rows: Dict[str, List[int]] = {}
+            for row in self.live_rows():
+                rows.setdefault(self.chunks[row].get('source', 'Unknown'), []).append(row)
+            self._source_rows = {source: np.array(r, dtype=np.int64) for source, r in rows.items()}
+        return self._source_rows
+
+    @property
+    def sources(self) -> List[str]:
+        return list(self._rows_by_source())
+
+    def text(self, row: int) -> str:
+        return self.chunks[row].get('text', '')
+
+    def source(self, row: int) -> str:
+        return self.chunks[row].get('source', 'Unknown')
+
+    def chunk_idx(self, row: int) -> int:
+        return self.chunks[row].get('chunk_idx', 0)
+
+    def rows_for_sources(self, matches: Callable[[str], bool]) -> np.ndarray:
+        selected = [rows for source, rows in self._rows_by_source().items() if matches(source)]
+        if not selected:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(selected))
+
+    def sentence_index_data(self, text: str) -> Optional[Dict]:
+        # Keyed by text rather than (source, chunk_idx), which old and new versions of a document share
+        if self._sentence_indexes is None:
+            self._sentence_indexes = {
+                self.chunks[row]['text']: self.chunks[row]['sentence_index']
+                for row in self.live_rows()
+                if 'sentence_index' in self.chunks[row]
+            }
+        return self._sentence_indexes.get(text)
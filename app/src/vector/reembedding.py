@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from constants import CHECKPOINT_INTERVAL_BATCHES
+from app.src.llm.embedding_generator import APIRequestError, EmbeddingGenerationError
+from app.src.utils.logging_manager import LoggingManager
+
+STATE_SUFFIX = '.reembed'
+
+def load_reembedding_state(path: str, model_id: str) -> Dict[str, np.ndarray]:
+    """Vectors already computed for `model_id` by an interrupted run; empty for another model or no file.
+
+    The file is JSON lines: a {"model_id"} header, then one {text_hash: vector} object per checkpoint.
+    """
+    embeddings: Dict[str, np.ndarray] = {}
+    try:
+        with open(path, 'r') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return {}
+            if not isinstance(header, dict) or header.get('model_id') != model_id:
+                return {}
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    # Torn by a crash mid-append; the checkpoints before it are intact
+                    break
+                embeddings.update((h, np.array(v, dtype=np.float32)) for h, v in batch.items())
+    except OSError:
+        return {}
+    return embeddings
+
+def start_reembedding_state(path: str, model_id: str, embeddings: Dict[str, np.ndarray]) -> None:
+    """Rewrites the state file as a header plus the vectors resumed from it, once per run.
+
+    This drops a torn last line, which would otherwise hide every checkpoint appended after it.
+    """
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write(json.dumps({'model_id': model_id}) + '\n')
+        if embeddings:
+            f.write(json.dumps({h: v.tolist() for h, v in embeddings.items()}) + '\n')
+    os.replace(temp_file, path)
+
+def append_reembedding_state(path: str, embeddings: Dict[str, np.ndarray]) -> None:
+    """Appends the vectors computed since the last checkpoint, without rewriting earlier ones."""
+    if not embeddings:
+        return
+    with open(path, 'a') as f:
+        f.write(json.dumps({h: v.tolist() for h, v in embeddings.items()}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+class ReembeddingJob:
+    """Rebuilds a cache's embeddings with the configured model while the old index keeps serving.
+
+    Vectors are computed from the cached chunk texts, keyed by text hash and checkpointed next to
+    the cache, so a restart resumes where the last run stopped. Once every live chunk has a new
+    vector the vector manager swaps cache, index and query model in one step under its write lock.
+    """
+
+    def __init__(
+        self,
+        vector_manager,
+        checkpoint_batches: int = CHECKPOINT_INTERVAL_BATCHES,
+        logger: Optional[LoggingManager] = None
+    ):
+        self.vector_manager = vector_manager
+        self.checkpoint_batches = checkpoint_batches
+        self.logger = logger or LoggingManager()
+        self.state_file = vector_manager.cache.cache_file + STATE_SUFFIX
+
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.from_model = (vector_manager.cache.embedding_model or {}).get('model_id')
+        self.to_model = vector_manager.embedding_generator.model_id
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._chunks_resumed = 0
+        self._embed_started: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='reembedding', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops after the current batch; finished batches are checkpointed for the next run."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self) -> bool:
+        generator = self.vector_manager.embedding_generator
+        self.status = 'running'
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        embeddings = load_reembedding_state(self.state_file, generator.model_id)
+        # Computed since the last checkpoint append
+        unsaved: Dict[str, np.ndarray] = {}
+        try:
+            if not self.vector_manager.identify_legacy_model():
+                raise EmbeddingGenerationError(f"Probing {self.to_model} for an untagged cache's dimension failed")
+            if not self.vector_manager.needs_reembedding():
+                # An untagged cache turned out to match the configured model
+                self.status = 'done'
+                return True
+            self.from_model = self.vector_manager.cache.embedding_model['model_id']
+            start_reembedding_state(self.state_file, generator.model_id, embeddings)
+            texts = self.vector_manager.chunk_texts()
+            pending = [text_hash for text_hash in texts if text_hash not in embeddings]
+            self.chunks_total = len(texts)
+            self.chunks_done = self._chunks_resumed = len(texts) - len(pending)
+            self._embed_started = time.monotonic()
+            self.logger.log_info(
+                f"Re-embedding {self.chunks_total} chunks {self.from_model} -> {self.to_model} "
+                f"({self.chunks_done} resumed from {self.state_file})"
+            )
+
+            batches = 0
+            for start in range(0, len(pending), generator.batch_size):
+                if self._stop.is_set():
+                    self.status = 'cancelled'
+                    return False
+                batch = pending[start:start + generator.batch_size]
+                vectors = generator.generate_embeddings_batch([texts[text_hash] for text_hash in batch])
+                if not vectors or len(vectors) != len(batch):
+                    raise EmbeddingGenerationError("Embedding batch failed - count mismatch")
+                unsaved.update((h, np.array(v, dtype=np.float32)) for h, v in zip(batch, vectors))
+                self.chunks_done += len(batch)
+                batches += 1
+                if batches % self.checkpoint_batches == 0:
+                    append_reembedding_state(self.state_file, unsaved)
+                    embeddings.update(unsaved)
+                    unsaved = {}
+
+            append_reembedding_state(self.state_file, unsaved)
+            embeddings.update(unsaved)
+            unsaved = {}
+            if not self.vector_manager.swap_embedding_model(embeddings):
+                raise EmbeddingGenerationError("Swapping in the re-embedded index failed")
+            os.remove(self.state_file)
+            self.status = 'done'
+            return True
+        except (APIRequestError, EmbeddingGenerationError, OSError) as e:
+            self.status = 'failed'
+            self.error = str(e)
+            self.logger.log_error(e, {'message': f'Re-embedding with {self.to_model} failed; resume it to continue'})
+            return False
+        finally:
+            if self.status != 'done' and unsaved:
+                try:
+                    append_reembedding_state(self.state_file, unsaved)
+                except OSError as e:
+                    self.logger.log_error(e, {'message': f'Checkpointing re-embedding to {self.state_file} failed'})
+            self.finished_at = time.time()
+            self.logger.log_info(f"Re-embedding {self.status}: {self.chunks_done}/{self.chunks_total} chunks")
+
+    def embeddings_per_second(self) -> float:
+        if self._embed_started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._embed_started
+        embedded = self.chunks_done - self._chunks_resumed
+        return embedded / elapsed if elapsed > 0 and embedded > 0 else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        rate = self.embeddings_per_second()
+        remaining = self.chunks_total - self.chunks_done
+        return {
+            'status': self.status,
+            'error': self.error,
+            'from_model': self.from_model,
+            'to_model': self.to_model,
+            'chunks': {'done': self.chunks_done, 'total': self.chunks_total},
+            'embeddings_per_second': round(rate, 2),
+            'eta_seconds': round(remaining / rate, 1) if self.status == 'running' and rate > 0 else None,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
@@ -0,0 +1,76 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[\.!?;])\s+')
+TERM_PATTERN = re.compile(r'[A-Za-z0-9]+')
+MIN_TERM_LENGTH = 4
+
+def query_terms(text: str) -> FrozenSet[str]:
+    return frozenset(t.lower() for t in TERM_PATTERN.findall(text) if len(t) >= MIN_TERM_LENGTH)
+
+@dataclass(frozen=True)
+class SentenceIndex:
+    """Sentence spans of a chunk with the terms excerpt scoring needs, computed once at ingest.
+
+    Sentences without any term or '%' can never score, so they are not stored.
+    """
+    spans: Tuple[Tuple[int, int], ...]
+    terms: Tuple[FrozenSet[str], ...]
+    percent_counts: Tuple[int, ...]
+
+    @classmethod
+    def build(cls, text: str) -> 'SentenceIndex':
+        spans, terms, percent_counts = [], [], []
+        start = 0
+        for boundary in SENTENCE_BOUNDARY.finditer(text):
+            cls._add_sentence(text, start, boundary.start(), spans, terms, percent_counts)
+            start = boundary.end()
+        cls._add_sentence(text, start, len(text), spans, terms, percent_counts)
+        return cls(tuple(spans), tuple(terms), tuple(percent_counts))
+
+    @staticmethod
+    def _add_sentence(text: str, start: int, end: int, spans: list, terms: list, percent_counts: list) -> None:
+        sentence = text[start:end]
+        sentence_terms = query_terms(sentence)
+        percents = sentence.count('%')
+        if sentence_terms or percents:
+            spans.append((start, end))
+            terms.append(sentence_terms)
+            percent_counts.append(percents)
+
+    def to_dict(self) -> Dict[str, list]:
+        return {
+            's': [offset for span in self.spans for offset in span],
+            't': [' '.join(sorted(sentence_terms)) for sentence_terms in self.terms],
+            'p': list(self.percent_counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, list]) -> 'SentenceIndex':
+        offsets = data.get('s', [])
+        return cls(
+            spans=tuple(zip(offsets[0::2], offsets[1::2])),
+            terms=tuple(frozenset(t.split()) for t in data.get('t', [])),
+            percent_counts=tuple(data.get('p', []))
+        )
+
+    def excerpt(self, text: str, terms: Set[str], limit: int) -> str:
+        scored: List[Tuple[int, int]] = []
+        for position, (sentence_terms, percents) in enumerate(zip(self.terms, self.percent_counts)):
+            score = len(sentence_terms & terms) + percents
+            if score > 0:
+                scored.append((score, position))
+
+        if not scored:
+            return ''
+
+        scored.sort(key=lambda x: x[0], reverse=True)
+        excerpt = ''
+        for _, position in scored:
+            start, end = self.spans[position]
+            sentence = text[start:end]
+            if len(excerpt) + len(sentence) + 1 > limit:
+                break
+            excerpt = (excerpt + ' ' + sentence).strip()
+        return excerpt[:limit]
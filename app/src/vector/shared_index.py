@@ -0,0 +1,212 @@
+import json
+import mmap
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.src.vector.index_snapshot import IndexView
+
+CURRENT_FILE = 'CURRENT'
+KEEP_GENERATIONS = 2
+
+def _generation_dir(directory: str, generation: int) -> str:
+    return os.path.join(directory, f'g{generation:08d}')
+
+def read_current(directory: str) -> Optional[Tuple[int, str]]:
+    """Generation number and fingerprint of the published index, if any."""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), 'r') as f:
+            current = json.load(f)
+        return int(current['generation']), current.get('fingerprint', '')
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _replace_atomically(path: str, write: Callable) -> None:
+    temp_path = f'{path}.tmp.{os.getpid()}'
+    with open(temp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def publish_index(
+    directory: str,
+    chunks: Sequence[Dict],
+    matrix: np.ndarray,
+    fingerprint: str = '',
+    embedding_model: Optional[Dict[str, Any]] = None
+) -> int:
+    """Writes a new index generation and points CURRENT at it.
+
+    Readers only ever follow CURRENT, which is swapped with a single rename after the
+    generation directory is complete, so they never observe a partial index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    current = read_current(directory)
+    if current is not None and fingerprint and current[1] == fingerprint:
+        return current[0]
+    generation = current[0] + 1 if current is not None else 1
+
+    target = _generation_dir(directory, generation)
+    staging = target + f'.staging.{os.getpid()}'
+    # Leftovers of a publish that crashed before moving CURRENT; nobody can be reading them
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    sources: List[str] = []
+    source_ids: Dict[str, int] = {}
+    encoded = [chunk['text'].encode('utf-8') for chunk in chunks]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    row_sources = np.empty(len(chunks), dtype=np.int32)
+    chunk_indices = np.empty(len(chunks), dtype=np.int32)
+    for row, chunk in enumerate(chunks):
+        source = chunk.get('source', 'Unknown')
+        if source not in source_ids:
+            source_ids[source] = len(sources)
+            sources.append(source)
+        row_sources[row] = source_ids[source]
+        chunk_indices[row] = chunk.get('chunk_idx', 0)
+
+    np.save(os.path.join(staging, 'embeddings.npy'), np.ascontiguousarray(matrix, dtype=np.float32))
+    np.save(os.path.join(staging, 'offsets.npy'), offsets)
+    np.save(os.path.join(staging, 'source_ids.npy'), row_sources)
+    np.save(os.path.join(staging, 'chunk_idx.npy'), chunk_indices)
+    with open(os.path.join(staging, 'texts.bin'), 'wb') as f:
+        f.writelines(encoded)
+    with open(os.path.join(staging, 'sources.json'), 'w') as f:
+        json.dump(sources, f)
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump({'embedding_model': embedding_model}, f)
+    os.replace(staging, target)
+
+    payload = json.dumps({'generation': generation, 'fingerprint': fingerprint}).encode('utf-8')
+    _replace_atomically(os.path.join(directory, CURRENT_FILE), lambda f: f.write(payload))
+    _prune_generations(directory, generation)
+    return generation
+
+def _prune_generations(directory: str, generation: int) -> None:
+    for name in os.listdir(directory):
+        if not name.startswith('g') or '.' in name:
+            continue
+        try:
+            old = int(name[1:])
+        except ValueError:
+            continue
+        if old <= generation - KEEP_GENERATIONS:
+            # Readers that still map an old generation keep their pages on POSIX; Windows refuses, which is fine
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+class SharedIndex(IndexView):
+    """Read-only, memory-mapped view of one published index generation.
+
+    Every worker maps the same files, so the embedding matrix and chunk texts live once in
+    the OS page cache no matter how many processes serve them.
+    """
+
+    def __init__(self, path: str, generation: int):
+        self.path = path
+        self.generation = generation
+        self.version = generation
+        self.matrix = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.source_ids = np.load(os.path.join(path, 'source_ids.npy'), mmap_mode='r')
+        self.chunk_indices = np.load(os.path.join(path, 'chunk_idx.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'sources.json'), 'r') as f:
+            self._sources: List[str] = json.load(f)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                self.embedding_model = json.load(f).get('embedding_model')
+
+        self._texts_file = open(os.path.join(path, 'texts.bin'), 'rb')
+        size = os.fstat(self._texts_file.fileno()).st_size
+        self._texts = mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes) + int(self.offsets[-1]) if len(self) else 0
+
+    @property
+    def sources(self) -> List[str]:
+        return self._sources
+
+    def text(self, row: int) -> str:
+        return self._texts[int(self.offsets[row]):int(self.offsets[row + 1])].decode('utf-8')
+
+    def source(self, row: int) -> str:
+        return self._sources[self.source_ids[row]]
+
+    def chunk_idx(self, row: int) -> int:
+        return int(self.chunk_indices[row])
+
+    def rows_for_sources(self, matches: Callable[[str], bool]) -> np.ndarray:
+        wanted = [source_id for source_id, source in enumerate(self._sources) if matches(source)]
+        return np.flatnonzero(np.isin(self.source_ids, wanted))
+
+    def close(self) -> None:
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+
+class SharedIndexReader:
+    """Follows the CURRENT pointer of a shared index directory, remapping when it moves."""
+
+    def __init__(self, directory: str, check_interval: float = 0.5):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._index: Optional[SharedIndex] = None
+        self._checked_at = 0.0
+
+    def current(self) -> Optional[SharedIndex]:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_interval:
+            return self._index
+        self._checked_at = now
+
+        current = read_current(self.directory)
+        if current is None or (self._index is not None and self._index.generation == current[0]):
+            return self._index
+        try:
+            # The old mapping is left to the garbage collector: in-flight searches may still hold it
+            self._index = SharedIndex(_generation_dir(self.directory, current[0]), current[0])
+        except (OSError, ValueError):
+            # Pruned between reading CURRENT and opening it; the next check picks up the newer one
+            pass
+        return self._index
+
+class WriterLock:
+    """Non-blocking inter-process lock electing the single worker that owns ingestion."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        handle = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        # Held for the life of the process; the OS releases it if the process dies
+        self._file = handle
+        return True
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
@@ -1,15 +1,30 @@
+import os
 import re
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
 import tiktoken
-from constants import DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP
+from constants import CHUNKER_MODES, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNKER_MODE, DEFAULT_OVERLAP
+
+_worker_chunker: Optional['TextChunker'] = None
+
+def _init_chunker_worker(chunk_size: int, overlap: int, mode: str) -> None:
+    global _worker_chunker
+    _worker_chunker = TextChunker(chunk_size, overlap, mode)
+
+def _chunk_in_worker(text: str) -> List[str]:
+    return _worker_chunker.chunk_text(text)
 
 class TextChunker:
-    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_OVERLAP):
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_OVERLAP, mode: str = DEFAULT_CHUNKER_MODE):
         if overlap >= chunk_size:
             raise ValueError("Overlap must be smaller than chunk size")
+        if mode not in CHUNKER_MODES:
+            raise ValueError(f"Unknown chunker mode '{mode}'. Available: {', '.join(CHUNKER_MODES)}")
             
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.mode = mode
         self.encoding = tiktoken.get_encoding('cl100k_base')
         
         self.sentence_endings = re.compile(
@@ -36,6 +51,7 @@ class TextChunker:
         ]
         
         self.header_footer_regex = re.compile('|'.join(self.header_footer_patterns), re.IGNORECASE)
+        self.whitespace_regex = re.compile(r'\s+')
 
     def _clean_text(self, text: str) -> str:
         text = self.header_footer_regex.sub('', text)
@@ -95,6 +111,51 @@ class TextChunker:
         
         return chunks
 
+    def _chunk_spans(self, token_counts: List[int]) -> List[Tuple[int, int]]:
+        spans = []
+        start = 0
+        current_tokens = 0
+
+        for i, sentence_tokens in enumerate(token_counts):
+            if current_tokens + sentence_tokens > self.chunk_size and i > start:
+                spans.append((start, i))
+
+                overlap_start = i
+                overlap_tokens = 0
+                while overlap_start > start and overlap_tokens + token_counts[overlap_start - 1] <= self.overlap:
+                    overlap_start -= 1
+                    overlap_tokens += token_counts[overlap_start]
+
+                start = overlap_start
+                current_tokens = overlap_tokens
+
+            current_tokens += sentence_tokens
+
+        if start < len(token_counts):
+            spans.append((start, len(token_counts)))
+
+        return spans
+
+    def _create_chunks_from_token_offsets(self, sentences: List[str]) -> List[str]:
+        # Each sentence is encoded exactly once. Encoding the joined document would let BPE
+        # merge across sentence boundaries and change the counts the chunk limits rely on.
+        token_counts = [len(self.encoding.encode_ordinary(sentence)) for sentence in sentences]
+
+        # Sentences are stripped, so collapsing whitespace per sentence and joining
+        # with single spaces matches normalizing each joined chunk afterwards.
+        normalized = [self.whitespace_regex.sub(' ', sentence) for sentence in sentences]
+        joined = ' '.join(normalized)
+        char_offsets = [0]
+        for sentence in normalized:
+            char_offsets.append(char_offsets[-1] + len(sentence) + 1)
+
+        chunks = []
+        for start, end in self._chunk_spans(token_counts):
+            chunk = joined[char_offsets[start]:char_offsets[end] - 1]
+            if len(chunk) >= 50 and not self._is_noise_chunk(chunk):
+                chunks.append(chunk)
+        return chunks
+
     def chunk_text(self, text: str) -> List[str]:
         if not text.strip():
             return []
@@ -109,6 +170,9 @@ class TextChunker:
         if not sentences:
             return []
 
+        if self.mode == 'token_offsets':
+            return self._create_chunks_from_token_offsets(sentences)
+
         chunks = self._create_chunks_from_sentences(sentences)
         
         final_chunks = []
@@ -137,4 +201,41 @@ class TextChunker:
         if max_freq > len(words) * 0.2:
             return True
         
-        return False
\ No newline at end of file
+        return False
+
+    def chunk_documents(
+        self,
+        documents: Iterable[Union[str, Tuple[Any, str]]],
+        max_workers: Optional[int] = None
+    ) -> Iterator[Tuple[Any, List[str]]]:
+        """Chunks many documents on a process pool, yielding (source_id, chunks) in input order.
+
+        Documents are plain texts (the source ID is their position) or (source_id, text) pairs.
+        """
+        items = (
+            (doc if isinstance(doc, tuple) else (position, doc))
+            for position, doc in enumerate(documents)
+        )
+        max_workers = max_workers or os.cpu_count() or 1
+
+        if max_workers == 1:
+            for source_id, text in items:
+                yield source_id, self.chunk_text(text)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_chunker_worker,
+            initargs=(self.chunk_size, self.overlap, self.mode)
+        ) as executor:
+            # Keep a bounded window in flight so huge corpora are not read into memory up front
+            pending = deque()
+            for source_id, text in items:
+                pending.append((source_id, executor.submit(_chunk_in_worker, text)))
+                if len(pending) >= max_workers * 2:
+                    source_id, future = pending.popleft()
+                    yield source_id, future.result()
+
+            while pending:
+                source_id, future = pending.popleft()
+                yield source_id, future.result()
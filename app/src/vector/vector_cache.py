@@ -1,17 +1,28 @@
 import json
 import numpy as np
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Set
 import os
 
 from constants import CACHE_VERSION
 from app.src.utils.logging_manager import LoggingManager
 
+CHECKPOINT_SUFFIX = '.checkpoint'
+
 class VectorCache:
     def __init__(self, cache_file: str):
         self.cache_file = cache_file
+        # Rows embedded since the last full save, one JSON line per batch; replayed on load
+        self.checkpoint_file = cache_file + CHECKPOINT_SUFFIX
+        self.persisted_rows = 0
         self.document_hashes: Dict[str, str] = {}
+        self.document_stats: Dict[str, List[int]] = {}
+        self.ingestion_checkpoints: Dict[str, Dict] = {}
         self.chunks: List[Dict] = []
         self.embeddings: List[np.ndarray] = []
+        # Rows of deleted chunks, kept until compaction drops them
+        self.tombstones: Set[int] = set()
+        # Model ID and dimension that produced the embeddings; None for caches written before tagging
+        self.embedding_model: Optional[Dict[str, Any]] = None
         self.logger = LoggingManager()
     
     def load(self) -> bool:
@@ -27,12 +38,18 @@ class VectorCache:
                 return False
                 
             self.document_hashes = cache_data.get('document_hashes', {})
+            self.document_stats = cache_data.get('document_stats', {})
+            self.ingestion_checkpoints = cache_data.get('ingestion_checkpoints', {})
             self.chunks = cache_data.get('chunks', [])
+            self.tombstones = set(cache_data.get('tombstones', []))
+            self.embedding_model = cache_data.get('embedding_model')
             
             embeddings = cache_data.get('embeddings', [])
             self.embeddings = [np.array(e, dtype=np.float32) for e in embeddings]
+            self.persisted_rows = len(self.chunks)
+            replayed = self._replay_checkpoint()
             
-            self.logger.log_info(f"Loaded cache with {len(self.chunks)} chunks")
+            self.logger.log_info(f"Loaded cache with {len(self.chunks)} chunks ({replayed} from the ingestion checkpoint)")
             return True
         except Exception as e:
             self.logger.log_error(f"Cache loading failed: {str(e)}")
@@ -44,14 +61,21 @@ class VectorCache:
             with open(temp_file, 'w') as f:
                 json.dump({
                     'version': CACHE_VERSION,
+                    'embedding_model': self.embedding_model,
                     'document_hashes': self.document_hashes,
+                    'document_stats': self.document_stats,
+                    'ingestion_checkpoints': self.ingestion_checkpoints,
                     'chunks': self.chunks,
+                    'tombstones': sorted(self.tombstones),
                     'embeddings': [e.tolist() for e in self.embeddings]
                 }, f, indent=2)
             
             if os.path.exists(self.cache_file):
                 os.remove(self.cache_file)
             os.rename(temp_file, self.cache_file)
+            # Everything the checkpoint held is in the cache file now
+            self._remove_checkpoint()
+            self.persisted_rows = len(self.chunks)
             
             self.logger.log_info(f"Saved cache with {len(self.chunks)} chunks")
             return True
@@ -61,6 +85,89 @@ class VectorCache:
     
     def clear(self) -> None:
         self.document_hashes = {}
+        self.document_stats = {}
+        self.ingestion_checkpoints = {}
         self.chunks = []
         self.embeddings = []
-        self.logger.log_info("Cache cleared")
\ No newline at end of file
+        self.tombstones = set()
+        self.embedding_model = None
+        self.persisted_rows = 0
+        self._remove_checkpoint()
+        self.logger.log_info("Cache cleared")
+
+    def unfinished_rows(self) -> Set[int]:
+        """Rows of documents whose ingestion hasn't completed; indexes mask them like tombstones."""
+        if not self.ingestion_checkpoints:
+            return set()
+        return {row for row, chunk in enumerate(self.chunks) if chunk['source'] in self.ingestion_checkpoints}
+
+    def append_checkpoint(self) -> bool:
+        """Appends the rows embedded since the last save to the checkpoint file, without rewriting the cache."""
+        rows = range(self.persisted_rows, len(self.chunks))
+        if not rows:
+            return True
+        lines = []
+        start = rows.start
+        for row in rows:
+            source = self.chunks[row]['source']
+            if row + 1 == rows.stop or self.chunks[row + 1]['source'] != source:
+                checkpoint = self.ingestion_checkpoints.get(source)
+                lines.append(json.dumps({
+                    'row': start,
+                    'doc_id': source,
+                    # None once the document was removed while its batches were still being embedded
+                    'checkpoint': {k: v for k, v in checkpoint.items() if k != 'embedded'} if checkpoint else None,
+                    'chunks': self.chunks[start:row + 1],
+                    'embeddings': [e.tolist() for e in self.embeddings[start:row + 1]],
+                    'tombstones': [r for r in range(start, row + 1) if r in self.tombstones]
+                }) + '\n')
+                start = row + 1
+        try:
+            with open(self.checkpoint_file, 'a') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            self.logger.log_error(f"Checkpoint append failed: {str(e)}")
+            return False
+        self.persisted_rows = rows.stop
+        return True
+
+    def _replay_checkpoint(self) -> int:
+        """Re-applies checkpointed batches on top of the cache file; stops at a torn or stale line."""
+        if not os.path.exists(self.checkpoint_file):
+            return 0
+        replayed = 0
+        with open(self.checkpoint_file, 'r') as f:
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    # Torn by a crash mid-append; the batches before it are intact
+                    break
+                if batch.get('row') != len(self.chunks):
+                    break
+                doc_id, header = batch['doc_id'], batch['checkpoint']
+                checkpoint = self.ingestion_checkpoints.get(doc_id)
+                if header is not None and (
+                    checkpoint is None or {k: v for k, v in checkpoint.items() if k != 'embedded'} != header
+                ):
+                    # A new attempt at this document: its earlier rows were rolled back before embedding
+                    self.tombstones.update(
+                        row for row, chunk in enumerate(self.chunks) if chunk['source'] == doc_id
+                    )
+                    self.document_hashes.pop(doc_id, None)
+                    self.document_stats.pop(doc_id, None)
+                    checkpoint = self.ingestion_checkpoints[doc_id] = {**header, 'embedded': []}
+                self.chunks.extend(batch['chunks'])
+                self.embeddings.extend(np.array(e, dtype=np.float32) for e in batch['embeddings'])
+                self.tombstones.update(batch.get('tombstones', []))
+                if header is not None:
+                    checkpoint['embedded'].extend(chunk.get('chunk_idx', 0) for chunk in batch['chunks'])
+                replayed += len(batch['chunks'])
+        self.persisted_rows = len(self.chunks)
+        return replayed
+
+    def _remove_checkpoint(self) -> None:
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
\ No newline at end of file
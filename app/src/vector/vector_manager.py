@@ -2,16 +2,24 @@ import os
 import time
 import re
 import hashlib
+import threading
+import uuid
 import numpy as np
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
-from sklearn.neighbors import NearestNeighbors
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
-from constants import HASH_CHUNK_SIZE, SEARCH_K, SIMILARITY_THRESHOLD_LOW
+from constants import (
+    CHECKPOINT_INTERVAL_BATCHES, HASH_CHUNK_SIZE, QUERY_EMBEDDING_BATCH, SEARCH_CACHE_SIZE, SEARCH_K,
+    SIMILARITY_THRESHOLD_LOW, UNKNOWN_EMBEDDING_MODEL
+)
 from app.src.vector.vector_cache import VectorCache
 from app.src.vector.text_chunker import TextChunker
+from app.src.vector.sentence_index import SentenceIndex
+from app.src.vector.index_snapshot import IndexSnapshot, IndexView
+from app.src.vector.shared_index import SharedIndexReader, publish_index
+from app.src.utils.latency import LatencyRecorder
 from app.src.utils.logging_manager import LoggingManager
+from app.src.utils.lru_cache import LRUCache
 from app.src.llm.embedding_generator import EmbeddingGenerator
 from app.src.llm.embedding_generator import APIRequestError, EmbeddingGenerationError
 
@@ -27,51 +35,161 @@ class VectorManager:
         embedding_generator: EmbeddingGenerator,
         cache_file: str,
         logger: Optional[LoggingManager] = None,
-        chunker: Optional[TextChunker] = None
+        chunker: Optional[TextChunker] = None,
+        verify_hashes: bool = False,
+        search_cache_size: int = SEARCH_CACHE_SIZE,
+        shared_index_dir: Optional[str] = None,
+        read_only: bool = False
     ):
+        if read_only and not shared_index_dir:
+            raise ValueError("read_only requires shared_index_dir")
         self.embedding_generator = embedding_generator
+        self.verify_hashes = verify_hashes
         self.chunker = chunker or TextChunker()
         self.cache = VectorCache(cache_file)
         self.logger = logger or LoggingManager()
         
         self._dirty_cache = False
-        self._nearest_neighbors = NearestNeighbors(n_neighbors=100, metric='cosine')
-        self._index_built = False
+        # Ingestion mutates the cache lists under the write lock; searches only ever read
+        # the published snapshot, which is replaced wholesale and never modified
+        self._write_lock = threading.RLock()
+        # Documents whose batches are being embedded, so the same one is never ingested twice at once
+        self._ingesting: Set[str] = set()
+        self._mutations = 0
+        self._snapshot = IndexSnapshot.empty()
+        # Live rows per document, so deletes and resumes never scan the whole cache
+        self._source_rows: Dict[str, List[int]] = {}
+        self._memory_bytes: Tuple[int, int] = (-1, 0)
+        self._file_hash_memo: Dict[str, Tuple[List[int], str]] = {}
+        self._search_cache = LRUCache(search_cache_size)
+        self._search_cache_version = 0
+        self._query_embedding_cache = LRUCache(search_cache_size)
+        # Generators for models other than the configured one, while an older index is still served
+        self._generators: Dict[str, EmbeddingGenerator] = {}
+        self._sentence_indexes: Dict[str, SentenceIndex] = {}
+        self._sentence_indexes_version: Optional[int] = None
+        self.latency = LatencyRecorder()
+
+        # With a shared index one writer process owns the cache and publishes generations that readers map
+        self.shared_index_dir = shared_index_dir
+        self.read_only = read_only
+        self._shared_reader = SharedIndexReader(shared_index_dir) if read_only else None
+        self._shared_generation: Optional[int] = None
+        # Set once a reader has read the cache file itself because nothing was published yet
+        self._fallback_loaded = False
         
-        self._initialize_cache()
+        if not read_only:
+            self._initialize_cache()
 
     def _initialize_cache(self) -> None:
         if not self.cache.load():
             self.logger.log_info("Cache not found or invalid version, initializing new cache")
             self.cache.clear()
         else:
-            self._build_index()
+            if self._legacy_dimension() is not None:
+                # Identified by `identify_legacy_model` once the embedding endpoint can be probed
+                self.logger.log_info("Cache predates model tagging; its embedding model is not known yet")
+            self._index_sources()
+            self._mutations += 1
+            self._build_snapshot()
+
+    def _index_sources(self) -> None:
+        self._source_rows = {}
+        for row, chunk in enumerate(self.cache.chunks):
+            if row not in self.cache.tombstones:
+                self._source_rows.setdefault(chunk['source'], []).append(row)
+
+    @property
+    def index_version(self) -> int:
+        return self.snapshot().version
+
+    def snapshot(self) -> IndexView:
+        """The index searches run against; grab it once per operation for consistent results."""
+        if self.read_only:
+            shared = self._shared_reader.current()
+            if shared is None:
+                return self._fallback_snapshot()
+            if len(self._snapshot):
+                # The writer has caught up; free the fallback copy
+                self._snapshot = IndexSnapshot.empty()
+            return shared
+        return self._snapshot
+
+    def _fallback_snapshot(self) -> IndexView:
+        """The persisted cache, read once, until the writer publishes this index for the first time.
 
-    def _build_index(self) -> None:
+        The writer only publishes collections it has loaded, so without this a reader would
+        answer from an empty index in the meantime.
+        """
+        with self._write_lock:
+            if not self._fallback_loaded:
+                self._fallback_loaded = True
+                cache = VectorCache(self.cache.cache_file)
+                if cache.load():
+                    self._snapshot = IndexSnapshot.build(
+                        0, cache.chunks, cache.embeddings, cache.tombstones | cache.unfinished_rows(), cache.embedding_model
+                    )
+                    self.logger.log_info(
+                        f"No shared index in {self.shared_index_dir} yet; serving {len(self._snapshot)} rows "
+                        f"read from {self.cache.cache_file}"
+                    )
+            return self._snapshot
+
+    def _build_snapshot(self) -> None:
         if not self.cache.embeddings:
             self.logger.log_info("No embeddings available for index building")
-            return
-            
         try:
-            embeddings_array = np.vstack(self.cache.embeddings)
-            norms = np.linalg.norm(embeddings_array, axis=1, keepdims=True)
-            normalized_embeddings = embeddings_array / norms
-            
-            self._nearest_neighbors.fit(normalized_embeddings)
-            self._index_built = True
-            self.logger.log_info(f"Built index for {len(self.cache.embeddings)} normalized embeddings")
+            # Checkpointed rows of a document stay out of searches until all of its chunks are embedded
+            dead_rows = self.cache.tombstones | self.cache.unfinished_rows()
+            snapshot = IndexSnapshot.build(
+                self._mutations, self.cache.chunks, self.cache.embeddings, dead_rows, self.cache.embedding_model
+            )
+            self._swap_snapshot(snapshot)
+            self.logger.log_info(f"Built index snapshot v{snapshot.version} for {len(snapshot)} normalized embeddings")
         except Exception as e:
             self.logger.log_error(f"Index building failed: {str(e)}")
             import traceback
             self.logger.log_error(traceback.format_exc())
-            self._index_built = False
+
+    def _swap_snapshot(self, snapshot: IndexSnapshot) -> None:
+        # A single reference assignment: in-flight searches keep the snapshot they started with
+        self._snapshot = snapshot
+        if self.shared_index_dir and len(snapshot):
+            self._publish_shared_index(snapshot)
+
+    def _publish_shared_index(self, snapshot: IndexSnapshot) -> None:
+        try:
+            # Unchanged cache file, unchanged index: restarts do not rewrite what readers already map
+            fingerprint = f"{len(snapshot)}:{self._get_file_signature(self.cache.cache_file) if os.path.exists(self.cache.cache_file) else ''}"
+            # Readers get live rows only, so a published generation never carries tombstones
+            chunks, matrix = snapshot.live_chunks_and_matrix()
+            generation = publish_index(self.shared_index_dir, chunks, matrix, fingerprint, snapshot.embedding_model)
+            self._shared_generation = generation
+            self.logger.log_info(f"Published shared index generation {generation} ({len(snapshot)} rows)")
+        except OSError as e:
+            self.logger.log_error(e, {"message": f"Publishing shared index to {self.shared_index_dir} failed"})
+
+    def _get_file_signature(self, file_path: str) -> List[int]:
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
 
     def _get_file_hash(self, file_path: str) -> str:
+        signature = self._get_file_signature(file_path)
+        memo = self._file_hash_memo.get(file_path)
+        if memo is not None and memo[0] == signature:
+            return memo[1]
+
         hasher = hashlib.sha256()
         with open(file_path, 'rb') as f:
             while chunk := f.read(HASH_CHUNK_SIZE):
                 hasher.update(chunk)
-        return hasher.hexdigest()
+        file_hash = hasher.hexdigest()
+        self._file_hash_memo[file_path] = (signature, file_hash)
+        return file_hash
+
+    def _record_document_stats(self, doc_id: str) -> None:
+        if os.path.exists(doc_id):
+            self.cache.document_stats[doc_id] = self._get_file_signature(doc_id)
 
     def _get_text_hash(self, text: str) -> str:
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -83,73 +201,219 @@ class VectorManager:
         try:
             if self.cache.save():
                 self._dirty_cache = False
-                self._build_index()
+                self._build_snapshot()
         except Exception as e:
             self.logger.log_error(e)
 
-    def _remove_document_chunks(self, doc_id: str) -> None:
-        indices_to_remove = [
-            i for i, chunk in enumerate(self.cache.chunks)
-            if chunk['source'] == doc_id
-        ]
-        
-        for i in sorted(indices_to_remove, reverse=True):
-            del self.cache.chunks[i]
-            del self.cache.embeddings[i]
+    def _remove_document_chunks(self, doc_id: str) -> List[int]:
+        # Tombstoned rather than deleted: row numbers stay stable until compaction
+        rows = self._source_rows.pop(doc_id, [])
+        self.cache.tombstones.update(rows)
         
         if doc_id in self.cache.document_hashes:
             del self.cache.document_hashes[doc_id]
+        self.cache.document_stats.pop(doc_id, None)
+        self.cache.ingestion_checkpoints.pop(doc_id, None)
         
+        self._mutations += 1
         self._dirty_cache = True
-        self.logger.log_info(f"Removed all chunks for document: {doc_id}")
+        self.logger.log_info(f"Removed all chunks for document: {doc_id} ({len(rows)} rows tombstoned)")
+        return rows
+
+    def _generator_for(self, embedding_model: Optional[Dict[str, Any]]) -> EmbeddingGenerator:
+        """The generator for the model an index was built with, so its rows and queries share one vector space."""
+        # Nothing else can embed for an unknown model; its rows stop matching until the re-embedding swap
+        model_id = (embedding_model or {}).get('model_id')
+        if model_id in (None, self.embedding_generator.model_id, UNKNOWN_EMBEDDING_MODEL):
+            return self.embedding_generator
+        if model_id not in self._generators:
+            self._generators[model_id] = self.embedding_generator.for_model(model_id)
+        return self._generators[model_id]
+
+    def needs_reembedding(self) -> bool:
+        """True when the cache was embedded by another model than the configured one, or one not identified yet."""
+        if self.read_only:
+            return False
+        model = self.cache.embedding_model
+        if model is None:
+            return self._legacy_dimension() is not None
+        return model['model_id'] != self.embedding_generator.model_id
 
-    def _process_batch(self, batch: List[Chunk]) -> bool:
+    def _legacy_dimension(self) -> Optional[int]:
+        """Dimension of embeddings cached before model tagging; None once tagged or when empty."""
+        if self.cache.embedding_model is not None or not self.cache.embeddings:
+            return None
+        return len(self.cache.embeddings[0])
+
+    def identify_legacy_model(self) -> bool:
+        """Tags an untagged cache by comparing its dimension with a probe from the configured model.
+
+        A match is taken to mean the configured model built it; otherwise the model is recorded as
+        unknown and the cache needs re-embedding. False if the probe failed.
+        """
+        if self.read_only or self._legacy_dimension() is None:
+            return True
+        probe = self.embedding_generator.generate_embedding("Embedding dimension probe")
+        if probe is None:
+            return False
+        with self._write_lock:
+            self._tag_legacy_model(len(probe))
+            self._save_cache()
+        return True
+
+    def _tag_legacy_model(self, configured_dimension: int) -> None:
+        dimension = self._legacy_dimension()
+        if dimension is None:
+            return
+        configured = self.embedding_generator.model_id
+        model_id = configured if dimension == configured_dimension else UNKNOWN_EMBEDDING_MODEL
+        self.cache.embedding_model = {'model_id': model_id, 'dimension': dimension}
+        self._dirty_cache = True
+        self.logger.log_info(
+            f"Cache predates model tagging: {dimension}-dimensional embeddings, {configured} returns "
+            f"{configured_dimension}; tagged as {model_id}"
+        )
+
+    def _process_batch(self, batch: List[Chunk], checkpoint: Dict) -> bool:
+        """Embeds a batch without the write lock, then appends its rows and checkpoint entries under it.
+
+        False if embedding failed or the document was removed or restarted in the meantime.
+        """
         try:
             texts = [chunk.text for chunk in batch]
-            embeddings = self.embedding_generator.generate_embeddings_batch(texts)
-            
-            if not embeddings or len(embeddings) != len(batch):
-                self.logger.log_error(Exception("Embedding batch failed - count mismatch"))
-                return False
-                
-            for chunk, embedding in zip(batch, embeddings):
-                self.cache.chunks.append({
-                    'text': chunk.text,
-                    'source': chunk.source,
-                    'chunk_idx': chunk.chunk_idx
-                })
-                self.cache.embeddings.append(np.array(embedding))
-            
-            self._dirty_cache = True
-            return True
-            
+            while True:
+                # Until a re-embedding swaps the index, new chunks join it in the model it was built with
+                generator = self._generator_for(self.cache.embedding_model)
+                embeddings = generator.generate_embeddings_batch(texts)
+
+                if not embeddings or len(embeddings) != len(batch):
+                    self.logger.log_error(Exception("Embedding batch failed - count mismatch"))
+                    return False
+
+                with self._write_lock:
+                    if self._generator_for(self.cache.embedding_model) is not generator:
+                        # The index was swapped to another model meanwhile; embed the batch again in that one
+                        continue
+                    if self.cache.ingestion_checkpoints.get(batch[0].source) is not checkpoint:
+                        return False
+
+                    # The batch doubles as the probe that identifies an untagged cache's model
+                    self._tag_legacy_model(len(embeddings[0]))
+                    model = self.cache.embedding_model
+                    if model is None or model.get('dimension') is None:
+                        model = self.cache.embedding_model = {'model_id': generator.model_id, 'dimension': len(embeddings[0])}
+                    if any(len(embedding) != model['dimension'] for embedding in embeddings):
+                        self.logger.log_error(EmbeddingGenerationError(
+                            f"{generator.model_id} returned {len(embeddings[0])}-dimensional embeddings; "
+                            f"the index holds {model['dimension']}-dimensional ones"
+                        ))
+                        return False
+
+                    for chunk, embedding in zip(batch, embeddings):
+                        self._source_rows.setdefault(chunk.source, []).append(len(self.cache.chunks))
+                        self.cache.chunks.append({
+                            'text': chunk.text,
+                            'source': chunk.source,
+                            'chunk_idx': chunk.chunk_idx,
+                            'sentence_index': SentenceIndex.build(chunk.text).to_dict()
+                        })
+                        self.cache.embeddings.append(np.array(embedding))
+                    checkpoint['embedded'].extend(chunk.chunk_idx for chunk in batch)
+
+                    self._mutations += 1
+                    self._dirty_cache = True
+                    return True
+
         except (APIRequestError, EmbeddingGenerationError) as e:
             self.logger.log_error(e)
             return False
 
-    def is_document_processed(self, source: str) -> bool:
+    def is_document_processed(self, source: str, verify: Optional[bool] = None) -> bool:
         if os.path.exists(source):
+            verify = self.verify_hashes if verify is None else verify
+            if (
+                not verify
+                and source in self.cache.document_hashes
+                and self.cache.document_stats.get(source) == self._get_file_signature(source)
+            ):
+                return True
+
             file_hash = self._get_file_hash(source)
+            if self.cache.document_hashes.get(source) == file_hash:
+                if self.cache.document_stats.get(source) != self._get_file_signature(source):
+                    self._record_document_stats(source)
+                    self._dirty_cache = True
+                return True
             return file_hash in self.cache.document_hashes.values()
         else:
             text_hash = self._get_text_hash(source)
             return text_hash in self.cache.document_hashes.values()
 
-    def add_document(self, text: str, source_path: Optional[str] = None) -> None:
+    def _chunker_signature(self) -> str:
+        return f"{self.chunker.chunk_size}:{self.chunker.overlap}"
+
+    def _embedded_chunk_indices(self, doc_id: str) -> set:
+        return {self.cache.chunks[row].get('chunk_idx', 0) for row in self._source_rows.get(doc_id, [])}
+
+    def _resume_checkpoint(self, doc_id: str, doc_hash: str, chunk_count: int) -> set:
+        checkpoint = self.cache.ingestion_checkpoints.get(doc_id)
+        embedded = self._embedded_chunk_indices(doc_id)
+
+        resumable = (
+            checkpoint is not None
+            and checkpoint.get('doc_hash') == doc_hash
+            and checkpoint.get('chunk_count') == chunk_count
+            and checkpoint.get('chunker') == self._chunker_signature()
+            and embedded == set(checkpoint.get('embedded', []))
+        )
+        if resumable:
+            self.logger.log_info(f'Resuming document from checkpoint: {doc_id} ({len(embedded)}/{chunk_count} chunks embedded)')
+            return embedded
+
+        if embedded:
+            self.logger.log_info(f'Rolling back partial ingestion: {doc_id} ({len(embedded)} chunks)')
+            self._remove_document_chunks(doc_id)
+
+        self.cache.ingestion_checkpoints[doc_id] = {
+            'doc_hash': doc_hash,
+            'chunk_count': chunk_count,
+            'chunker': self._chunker_signature(),
+            # Distinguishes this attempt's checkpointed rows from a rolled-back one on replay
+            'attempt': uuid.uuid4().hex,
+            'embedded': []
+        }
+        return set()
+
+    def _commit_checkpoint(self) -> None:
+        # Only the new rows are appended; the cache file is rewritten once, when the document completes
+        self.cache.append_checkpoint()
+
+    def add_document(
+        self,
+        text: str,
+        source_path: Optional[str] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """Indexes a document; True once all of its chunks are embedded (or it was already indexed).
+
+        Chunking and embedding run outside the write lock, which is only taken to check the
+        document in, append each finished batch and publish the result; removals, compaction
+        and other ingestions proceed in between. `progress(embedded, total)` is called after
+        every committed batch; an exception raised from it stops ingestion, leaving the
+        checkpoint to resume from.
+        """
+        if self.read_only:
+            self.logger.log_error(Exception('Read-only worker cannot ingest documents; the writer process owns ingestion'))
+            return False
         if not text.strip():
             self.logger.log_error(Exception('Text cannot be empty'))
-            return
+            return False
 
         doc_id = source_path or f"text_{self._get_text_hash(text)}"
         doc_hash = self._get_file_hash(source_path) if source_path else self._get_text_hash(text)
-        
-        if doc_id in self.cache.document_hashes:
-            if self.cache.document_hashes[doc_id] == doc_hash:
-                self.logger.log_info(f'Document unchanged: {doc_id}')
-                return
-            else:
-                self.logger.log_info(f'Document updated: {doc_id}')
-                self._remove_document_chunks(doc_id)
+        if self.cache.document_hashes.get(doc_id) == doc_hash:
+            self.logger.log_info(f'Document unchanged: {doc_id}')
+            return True
 
         self.logger.log_info(f'Processing document: {doc_id}')
         chunks = self.chunker.chunk_text(text)
@@ -159,125 +423,434 @@ class VectorManager:
         
         if not chunks:
             self.logger.log_info(f'No chunks generated for document: {doc_id}')
-            return
+            return False
+
+        with self._write_lock:
+            if doc_id in self._ingesting:
+                self.logger.log_error(Exception(f'Document is already being ingested: {doc_id}'))
+                return False
+            if doc_id in self.cache.document_hashes:
+                if self.cache.document_hashes[doc_id] == doc_hash:
+                    self.logger.log_info(f'Document unchanged: {doc_id}')
+                    return True
+                self.logger.log_info(f'Document updated: {doc_id}')
+                self._remove_document_chunks(doc_id)
+            embedded = self._resume_checkpoint(doc_id, doc_hash, len(chunks))
+            checkpoint = self.cache.ingestion_checkpoints[doc_id]
+            self._ingesting.add(doc_id)
+        try:
+            return self._embed_document(doc_id, doc_hash, chunks, embedded, checkpoint, progress)
+        finally:
+            with self._write_lock:
+                self._ingesting.discard(doc_id)
 
+    def _embed_document(
+        self,
+        doc_id: str,
+        doc_hash: str,
+        chunks: List[str],
+        embedded: set,
+        checkpoint: Dict,
+        progress: Optional[Callable[[int, int], None]]
+    ) -> bool:
+        pending = [idx for idx in range(len(chunks)) if idx not in embedded]
         batch_size = min(self.embedding_generator.batch_size, 10)
-        processed_chunks = 0
+        processed_chunks = len(embedded)
+        batches_since_commit = 0
+        if progress is not None:
+            progress(processed_chunks, len(chunks))
         
-        for i in range(0, len(chunks), batch_size):
-            batch = [
-                Chunk(
-                    text=chunk,
-                    source=doc_id,
-                    chunk_idx=i + idx
-                )
-                for idx, chunk in enumerate(chunks[i:i + batch_size])
-            ]
-            
-            if self._process_batch(batch):
-                processed_chunks += len(batch)
-                self.logger.log_info(f'Processed {processed_chunks}/{len(chunks)} chunks')
-                time.sleep(0.5)
+        try:
+            for i in range(0, len(pending), batch_size):
+                if self.cache.ingestion_checkpoints.get(doc_id) is not checkpoint:
+                    break
+                batch = [
+                    Chunk(
+                        text=chunks[chunk_idx],
+                        source=doc_id,
+                        chunk_idx=chunk_idx
+                    )
+                    for chunk_idx in pending[i:i + batch_size]
+                ]
+
+                if self._process_batch(batch, checkpoint):
+                    processed_chunks += len(batch)
+                    self.logger.log_info(f'Processed {processed_chunks}/{len(chunks)} chunks')
+
+                    batches_since_commit += 1
+                    if batches_since_commit >= CHECKPOINT_INTERVAL_BATCHES:
+                        with self._write_lock:
+                            self._commit_checkpoint()
+                        batches_since_commit = 0
+                    if progress is not None:
+                        progress(processed_chunks, len(chunks))
+                    # Throttles the embedding endpoint; no lock is held here
+                    time.sleep(0.5)
+        except BaseException:
+            # E.g. a progress callback cancelling the job: batches embedded since the last commit are kept
+            with self._write_lock:
+                self._commit_checkpoint()
+            raise
 
-        if processed_chunks == len(chunks):
-            self.cache.document_hashes[doc_id] = doc_hash
+        with self._write_lock:
+            if self.cache.ingestion_checkpoints.get(doc_id) is not checkpoint:
+                self.logger.log_info(f'Ingestion superseded: {doc_id} was removed or restarted meanwhile')
+                return False
+
+            if processed_chunks == len(chunks):
+                del self.cache.ingestion_checkpoints[doc_id]
+                self.cache.document_hashes[doc_id] = doc_hash
+                self._record_document_stats(doc_id)
+                self._dirty_cache = True
+                self._save_cache()
+                self.logger.log_info(f'Successfully processed document: {doc_id} (chunks: {len(chunks)})')
+                return True
+
+            self._dirty_cache = True
+            self._commit_checkpoint()
+            self._build_snapshot()
+        self.logger.log_error(Exception(f'Failed to process all chunks for document: {doc_id} ({processed_chunks}/{len(chunks)} checkpointed)'))
+        return False
+
+    def document_hash(self, doc_id: str) -> Optional[str]:
+        return self.cache.document_hashes.get(doc_id)
+
+    def document_sources(self) -> List[str]:
+        return list(self.cache.document_hashes)
+
+    def document_size(self, doc_id: str) -> Optional[int]:
+        stats = self.cache.document_stats.get(doc_id)
+        return stats[0] if stats else None
+
+    def file_hash(self, file_path: str) -> str:
+        return self._get_file_hash(file_path)
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Drops a document from the index, e.g. after its file was deleted."""
+        if self.read_only:
+            self.logger.log_error(Exception('Read-only worker cannot remove documents; the writer process owns ingestion'))
+            return False
+        with self._write_lock:
+            if doc_id not in self.cache.document_hashes and doc_id not in self.cache.ingestion_checkpoints:
+                return False
+            rows = self._remove_document_chunks(doc_id)
+            # Searches stop seeing the rows at once: the new snapshot shares the matrix and only masks them.
+            # Persisted by the next flush or compaction; the startup scan purges missing files again after a crash
+            self._swap_snapshot(self._snapshot.with_deleted(self._mutations, rows))
+            return True
+
+    def rename_document(self, old_id: str, new_id: str) -> bool:
+        """Relabels a moved document's chunks instead of embedding them again."""
+        if self.read_only:
+            self.logger.log_error(Exception('Read-only worker cannot rename documents; the writer process owns ingestion'))
+            return False
+        with self._write_lock:
+            if old_id not in self.cache.document_hashes or new_id in self.cache.document_hashes:
+                return False
+            rows = self._source_rows.pop(old_id, [])
+            for row in rows:
+                # Published snapshots share these dicts, so they are replaced rather than edited
+                self.cache.chunks[row] = {**self.cache.chunks[row], 'source': new_id}
+            self._source_rows[new_id] = rows
+            self.cache.document_hashes[new_id] = self.cache.document_hashes.pop(old_id)
+            self.cache.document_stats.pop(old_id, None)
+            self._record_document_stats(new_id)
+            self._mutations += 1
+            self._dirty_cache = True
             self._save_cache()
-            self.logger.log_info(f'Successfully processed document: {doc_id} (chunks: {len(chunks)})')
-        else:
-            self.logger.log_error(Exception(f'Failed to process all chunks for document: {doc_id}'))
+            self.logger.log_info(f"Renamed document: {old_id} -> {new_id}")
+            return True
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: the index matrix plus the cached embeddings and chunk texts."""
+        snapshot = self.snapshot()
+        if self.read_only:
+            return snapshot.nbytes
+        if self._memory_bytes[0] != self._mutations:
+            embeddings = sum(e.nbytes for e in self.cache.embeddings)
+            texts = sum(len(chunk.get('text', '')) for chunk in self.cache.chunks)
+            self._memory_bytes = (self._mutations, embeddings + texts)
+        return snapshot.nbytes + self._memory_bytes[1]
+
+    def dead_fraction(self) -> float:
+        return len(self.cache.tombstones) / len(self.cache.chunks) if self.cache.chunks else 0.0
+
+    def flush(self) -> None:
+        """Persists pending changes, such as tombstones, without rebuilding the index."""
+        if self.read_only:
+            return
+        with self._write_lock:
+            if self._dirty_cache and self.cache.save():
+                self._dirty_cache = False
+
+    def compact(self) -> int:
+        """Physically drops tombstoned rows and rewrites the cache; returns the rows dropped."""
+        if self.read_only:
+            return 0
+        with self._write_lock:
+            dead = self.cache.tombstones
+            if not dead:
+                return 0
+            keep = [row for row in range(len(self.cache.chunks)) if row not in dead]
+            self.cache.chunks = [self.cache.chunks[row] for row in keep]
+            self.cache.embeddings = [self.cache.embeddings[row] for row in keep]
+            self.cache.tombstones = set()
+            self._index_sources()
+            self._mutations += 1
+            self._dirty_cache = True
+            self._save_cache()
+            self.logger.log_info(f"Compacted index: dropped {len(dead)} dead rows, {len(keep)} remain")
+            return len(dead)
+
+    def chunk_texts(self) -> Dict[str, str]:
+        """Live chunk texts keyed by SHA-256, the unit a re-embedding works in; read from the published snapshot."""
+        snapshot = self._snapshot
+        texts = (snapshot.text(row) for row in snapshot.live_rows())
+        return {self._get_text_hash(text): text for text in texts}
+
+    def swap_embedding_model(self, embeddings: Dict[str, np.ndarray]) -> bool:
+        """Replaces every live row's vector with one from the configured model, keyed as in `chunk_texts`.
+
+        Chunks ingested since `embeddings` was computed are embedded here, under the write lock,
+        so the cache, the index and the query model change together. Tombstoned rows are dropped.
+        """
+        if self.read_only:
+            return False
+        generator = self.embedding_generator
+        with self._write_lock:
+            live = [row for row in range(len(self.cache.chunks)) if row not in self.cache.tombstones]
+            hashes = [self._get_text_hash(self.cache.chunks[row]['text']) for row in live]
+            missing = {h: self.cache.chunks[row]['text'] for h, row in zip(hashes, live) if h not in embeddings}
+            embeddings = dict(embeddings)
+            keys = list(missing)
+            for start in range(0, len(keys), generator.batch_size):
+                batch = keys[start:start + generator.batch_size]
+                try:
+                    vectors = generator.generate_embeddings_batch([missing[h] for h in batch])
+                except (APIRequestError, EmbeddingGenerationError) as e:
+                    self.logger.log_error(e)
+                    return False
+                if not vectors or len(vectors) != len(batch):
+                    self.logger.log_error(Exception("Embedding batch failed - count mismatch"))
+                    return False
+                embeddings.update(zip(batch, vectors))
+
+            vectors = [np.asarray(embeddings[h], dtype=np.float32) for h in hashes]
+            dimensions = {len(vector) for vector in vectors}
+            if len(dimensions) > 1:
+                self.logger.log_error(EmbeddingGenerationError(f"{generator.model_id} returned mixed dimensions: {sorted(dimensions)}"))
+                return False
+
+            previous = self.cache.embedding_model
+            self.cache.chunks = [self.cache.chunks[row] for row in live]
+            self.cache.embeddings = vectors
+            self.cache.tombstones = set()
+            self.cache.embedding_model = {'model_id': generator.model_id, 'dimension': dimensions.pop() if dimensions else None}
+            self._index_sources()
+            self._mutations += 1
+            self._dirty_cache = True
+            self._save_cache()
+            self.logger.log_info(
+                f"Swapped embedding model {previous['model_id'] if previous else None} -> {generator.model_id} "
+                f"({len(vectors)} rows, {len(missing)} embedded during the swap)"
+            )
+            return True
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return ' '.join(query.lower().split())
 
-    def search(self, query: str, k: int = SEARCH_K, min_similarity: float = SIMILARITY_THRESHOLD_LOW) -> List[Tuple[str, float, str, int]]:
-        if not query.strip() or not self.cache.embeddings:
-            self.logger.log_info(f"Empty query or no embeddings. Query: '{query}', Embeddings count: {len(self.cache.embeddings)}")
+    @staticmethod
+    def _source_key(sources: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+        return tuple(sorted(set(sources))) if sources else None
+
+    @staticmethod
+    def _matches_sources(source: str, sources: Tuple[str, ...]) -> bool:
+        return source in sources or os.path.basename(source) in sources
+
+    def _check_search_cache_version(self, version: int) -> None:
+        # Keys carry the index version, so stale entries are unreachable; drop them eagerly to free memory
+        if self._search_cache_version != version:
+            self._search_cache.clear()
+            self._search_cache_version = version
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        if not query.strip():
+            return None
+        generator = self._generator_for(self.snapshot().embedding_model)
+        key = (generator.model_id, query.strip())
+        cached = self._query_embedding_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self.latency.time('embed'):
+            query_embedding = generator.generate_embedding(query)
+        if query_embedding is None:
+            return None
+        query_embedding = np.array(query_embedding, dtype=np.float32)
+        self._query_embedding_cache.put(key, query_embedding)
+        return query_embedding
+
+    def embed_queries(self, queries: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Embeddings for many queries, fetching all cache misses in as few API calls as possible."""
+        embeddings: List[Optional[np.ndarray]] = [None] * len(queries)
+        generator = self._generator_for(self.snapshot().embedding_model)
+        missing: Dict[Tuple[str, str], List[int]] = {}
+        for position, query in enumerate(queries):
+            if not query.strip():
+                continue
+            key = (generator.model_id, query.strip())
+            cached = self._query_embedding_cache.get(key)
+            if cached is not None:
+                embeddings[position] = cached
+            else:
+                missing.setdefault(key, []).append(position)
+
+        keys = list(missing)
+        for start in range(0, len(keys), QUERY_EMBEDDING_BATCH):
+            batch = keys[start:start + QUERY_EMBEDDING_BATCH]
+            try:
+                with self.latency.time('embed'):
+                    vectors = generator.generate_embeddings_batch([text for _, text in batch])
+            except (APIRequestError, EmbeddingGenerationError) as e:
+                self.logger.log_error(e)
+                vectors = None
+            if not vectors or len(vectors) != len(batch):
+                continue
+            for key, vector in zip(batch, vectors):
+                vector = np.array(vector, dtype=np.float32)
+                self._query_embedding_cache.put(key, vector)
+                for position in missing[key]:
+                    embeddings[position] = vector
+        return embeddings
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        k: int = SEARCH_K,
+        min_similarity: float = SIMILARITY_THRESHOLD_LOW,
+        sources: Optional[Sequence[str]] = None
+    ) -> List[List[Tuple[str, float, str, int]]]:
+        """Vector search for many queries against one snapshot, scored in a single matrix product."""
+        snapshot = self.snapshot()
+        results: List[List[Tuple[str, float, str, int]]] = [[] for _ in queries]
+        if not len(snapshot):
+            return results
+
+        self._check_search_cache_version(snapshot.version)
+        source_key = self._source_key(sources)
+        pending: List[Tuple[int, str, tuple]] = []
+        for position, query in enumerate(queries):
+            if not query.strip():
+                continue
+            cache_key = ('vector', self._normalize_query(query), k, min_similarity, source_key, snapshot.version)
+            cached = self._search_cache.get(cache_key)
+            if cached is not None:
+                results[position] = list(cached)
+            else:
+                pending.append((position, query, cache_key))
+        if not pending:
+            return results
+
+        embeddings = self.embed_queries([query for _, query, _ in pending])
+        embedded = [(item, embedding) for item, embedding in zip(pending, embeddings) if embedding is not None]
+        if not embedded:
+            return results
+
+        rows = None
+        if source_key is not None:
+            rows = snapshot.rows_for_sources(lambda source: self._matches_sources(source, source_key))
+            if not len(rows):
+                return results
+
+        with self.latency.time('search'):
+            hits = snapshot.nearest_batch(np.vstack([embedding for _, embedding in embedded]), k, min_similarity, rows)
+        for ((position, _, cache_key), _), query_hits in zip(embedded, hits):
+            results[position] = [snapshot.result(row, similarity) for row, similarity in query_hits]
+            self._search_cache.put(cache_key, tuple(results[position]))
+        return results
+
+    def search(
+        self,
+        query: str,
+        k: int = SEARCH_K,
+        min_similarity: float = SIMILARITY_THRESHOLD_LOW,
+        query_embedding: Optional[np.ndarray] = None,
+        sources: Optional[Sequence[str]] = None
+    ) -> List[Tuple[str, float, str, int]]:
+        snapshot = self.snapshot()
+        if not query.strip() or not len(snapshot):
+            self.logger.log_info(f"Empty query or no embeddings. Query: '{query}', Embeddings count: {len(snapshot)}")
             return []
 
-        query_embedding = self.embedding_generator.generate_embedding(query)
+        self._check_search_cache_version(snapshot.version)
+        source_key = self._source_key(sources)
+        cache_key = ('vector', self._normalize_query(query), k, min_similarity, source_key, snapshot.version)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         if query_embedding is None:
             self.logger.log_info("Failed to generate query embedding")
             return []
 
         try:
-            self.logger.log_info(f"Index built: {self._index_built}")
-            self.logger.log_info(f"Available embeddings: {len(self.cache.embeddings)}")
-            self.logger.log_info(f"Query embedding shape: {np.array(query_embedding).shape}")
-            self.logger.log_info(f"First embedding shape: {self.cache.embeddings[0].shape if self.cache.embeddings else 'N/A'}")
-            self.logger.log_info(f"K value: {k}, min_similarity: {min_similarity}")
-            
-            if self._index_built:
-                n_neighbors = min(k * 2, len(self.cache.embeddings))
-                self.logger.log_info(f"Searching for {n_neighbors} neighbors")
-                
-                query_norm = np.linalg.norm(query_embedding)
-                normalized_query = query_embedding / query_norm
-                
-                distances, indices = self._nearest_neighbors.kneighbors(
-                    [normalized_query], n_neighbors=n_neighbors
-                )
-                
-                self.logger.log_info(f"Raw distances: {distances}")
-                self.logger.log_info(f"Raw indices: {indices}")
-                
-                results = [
-                    (self.cache.chunks[i]['text'], 1 - distances[0][idx], 
-                    self.cache.chunks[i].get('source', 'Unknown'), 
-                    self.cache.chunks[i].get('chunk_idx', 0))
-                    for idx, i in enumerate(indices[0])
-                    if (1 - distances[0][idx]) >= min_similarity
-                ]
-                
-                self.logger.log_info(f"Filtered results count: {len(results)}")
-                return results[:k]
-            else:
-                self.logger.log_info("Using fallback cosine similarity method")
-                query_embedding = np.array(query_embedding).reshape(1, -1)
-                embeddings = np.vstack(self.cache.embeddings)
-                
-                query_norm = np.linalg.norm(query_embedding, axis=1, keepdims=True)
-                embeddings_norm = np.linalg.norm(embeddings, axis=1, keepdims=True)
-                
-                normalized_query = query_embedding / query_norm
-                normalized_embeddings = embeddings / embeddings_norm
-                
-                sims = cosine_similarity(normalized_query, normalized_embeddings)[0]
-                
-                self.logger.log_info(f"Similarities range: min={sims.min():.3f}, max={sims.max():.3f}, mean={sims.mean():.3f}")
-                
-                valid_indices = np.where(sims >= min_similarity)[0]
-                self.logger.log_info(f"Indices above threshold {min_similarity}: {len(valid_indices)}")
-                
-                if len(valid_indices) == 0:
-                    top_5_indices = np.argsort(sims)[-5:][::-1]
-                    for i in top_5_indices:
-                        self.logger.log_info(f"Top similarity {i}: {sims[i]:.3f}")
-                    return []
-                
-                top_indices = valid_indices[np.argsort(sims[valid_indices])[-k:][::-1]]
-                
-                results = [
-                    (self.cache.chunks[i]['text'], sims[i], self.cache.chunks[i].get('source', 'Unknown'), self.cache.chunks[i].get('chunk_idx', 0))
-                    for i in top_indices
-                ]
-                
-                self.logger.log_info(f"Fallback results count: {len(results)}")
-                return results
-                
+            with self.latency.time('search'):
+                results = self._search_by_embedding(snapshot, query_embedding, k, min_similarity, source_key)
         except Exception as e:
             self.logger.log_error(f"Search error: {str(e)}")
             import traceback
             self.logger.log_error(traceback.format_exc())
             return []
 
-    def search_lexical(self, query: str, k: int = SEARCH_K) -> List[Tuple[str, float, str, int]]:
-        if not query.strip() or not self.cache.chunks:
+        self._search_cache.put(cache_key, tuple(results))
+        return results
+
+    def _search_by_embedding(
+        self,
+        snapshot: IndexView,
+        query_embedding: np.ndarray,
+        k: int,
+        min_similarity: float,
+        source_key: Optional[Tuple[str, ...]] = None
+    ) -> List[Tuple[str, float, str, int]]:
+        rows = None
+        if source_key is not None:
+            rows = snapshot.rows_for_sources(lambda source: self._matches_sources(source, source_key))
+            if not len(rows):
+                return []
+
+        results = [snapshot.result(row, similarity) for row, similarity in snapshot.nearest(query_embedding, k, min_similarity, rows)]
+        self.logger.log_info(
+            f"Vector search over {len(snapshot) if rows is None else len(rows)} rows (v{snapshot.version}): "
+            f"{len(results)} results with similarity >= {min_similarity}"
+        )
+        return results
+
+    def search_lexical(self, query: str, k: int = SEARCH_K, sources: Optional[Sequence[str]] = None) -> List[Tuple[str, float, str, int]]:
+        snapshot = self.snapshot()
+        if not query.strip() or not len(snapshot):
             return []
 
         tokens = set([t for t in re.findall(r"[A-Za-z0-9]+", query.lower()) if len(t) > 2])
         if not tokens:
             return []
 
-        scored: List[Tuple[float, int]] = []
-        for idx, chunk in enumerate(self.cache.chunks):
-            text = chunk.get('text', '')
+        self._check_search_cache_version(snapshot.version)
+        source_key = self._source_key(sources)
+        cache_key = ('lexical', self._normalize_query(query), k, source_key, snapshot.version)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        scored: List[Tuple[float, Tuple[str, str, int]]] = []
+        for row in snapshot.live_rows():
+            source = snapshot.source(row)
+            if source_key is not None and not self._matches_sources(source, source_key):
+                continue
+            text = snapshot.text(row)
             lower = text.lower()
             score = 0
             for t in tokens:
@@ -286,32 +859,63 @@ class VectorManager:
             score += lower.count('%')
 
             if score > 0:
-                scored.append((float(score), idx))
+                scored.append((float(score), (text, source, snapshot.chunk_idx(row))))
 
         if not scored:
+            self._search_cache.put(cache_key, ())
             return []
 
         scored.sort(key=lambda x: x[0], reverse=True)
         top = scored[:k]
         max_score = top[0][0] if top else 1.0
         results: List[Tuple[str, float, str, int]] = []
-        for score, i in top:
+        for score, (text, source, chunk_idx) in top:
             pseudo_similarity = min(0.99, (score / (max_score + 1e-6)) * 0.95)
-            results.append((self.cache.chunks[i]['text'], pseudo_similarity, self.cache.chunks[i].get('source', 'Unknown'), self.cache.chunks[i].get('chunk_idx', 0)))
+            results.append((text, pseudo_similarity, source, chunk_idx))
+        self._search_cache.put(cache_key, tuple(results))
         return results
 
-    def get_stats(self) -> Dict[str, int]:
+    def sentence_index(self, text: str) -> SentenceIndex:
+        """Sentence spans of a chunk, looked up by its text so they always describe that exact text."""
+        snapshot = self.snapshot()
+        if self._sentence_indexes_version != snapshot.version:
+            self._sentence_indexes = {}
+            self._sentence_indexes_version = snapshot.version
+
+        index = self._sentence_indexes.get(text)
+        if index is None:
+            stored = snapshot.sentence_index_data(text)
+            # Chunks cached before sentence indexes existed are indexed on first use
+            index = SentenceIndex.from_dict(stored) if stored is not None else SentenceIndex.build(text)
+            self._sentence_indexes[text] = index
+        return index
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot()
         return {
-            'documents': len(self.cache.document_hashes),
-            'chunks': len(self.cache.chunks),
-            'embeddings': len(self.cache.embeddings),
-            'index_built': self._index_built
+            'role': 'reader' if self.read_only else 'writer' if self.shared_index_dir else 'standalone',
+            'embedding_model': snapshot.embedding_model if self.read_only else self.cache.embedding_model,
+            'shared_generation': snapshot.version if self.read_only else self._shared_generation,
+            'documents': len(snapshot.sources) if self.read_only else len(self.cache.document_hashes),
+            'chunks': len(snapshot) if self.read_only else len(self.cache.chunks) - len(self.cache.tombstones),
+            'embeddings': len(snapshot) if self.read_only else len(self.cache.embeddings) - len(self.cache.tombstones),
+            'tombstones': 0 if self.read_only else len(self.cache.tombstones),
+            'dead_fraction': 0.0 if self.read_only else round(self.dead_fraction(), 4),
+            'indexed_rows': len(snapshot),
+            'index_built': len(snapshot) > 0,
+            'index_version': snapshot.version,
+            'index_bytes': snapshot.nbytes,
+            'cache_file_bytes': os.path.getsize(self.cache.cache_file) if os.path.exists(self.cache.cache_file) else 0,
+            'search_cache': self._search_cache.get_stats(),
+            'query_embedding_cache': self._query_embedding_cache.get_stats(),
+            'latency': self.latency.get_stats()
         }
     
 
 
     def close(self) -> None:
-        self._save_cache()
+        with self._write_lock:
+            self._save_cache()
         self.logger.log_info("VectorManager shutdown complete")
 
     def __enter__(self):
@@ -0,0 +1,67 @@
+import os
+import sys
+import glob
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import CHUNKER_MODES, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP
+from app.src.vector.text_chunker import TextChunker
+from app.src.document_processing.pdf_formatter import PDFFormatter
+
+def load_texts(args: List[str]) -> List[str]:
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(sorted(glob.glob(os.path.join(arg, '**', '*.pdf'), recursive=True)))
+            paths.extend(sorted(glob.glob(os.path.join(arg, '**', '*.txt'), recursive=True)))
+        else:
+            paths.append(arg)
+
+    texts = []
+    for path in paths:
+        if path.endswith('.pdf'):
+            texts.append(PDFFormatter.extract_text(path) or '')
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+    return texts
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/chunker_benchmark.py <pdf-or-txt-file-or-directory> [...] [--repeat N]")
+        return
+
+    args = sys.argv[1:]
+    repeat = 3
+    if '--repeat' in args:
+        position = args.index('--repeat')
+        repeat = int(args[position + 1])
+        args = args[:position] + args[position + 2:]
+
+    texts = load_texts(args)
+    total_mb = sum(len(text.encode('utf-8')) for text in texts) / (1024 * 1024)
+    if not total_mb:
+        print("No text to chunk")
+        return
+
+    outputs = {}
+    print(f"{'mode':<14} {'MB':>8} {'best s':>8} {'MB/s':>8} {'chunks':>8}")
+    for mode in CHUNKER_MODES:
+        chunker = TextChunker(DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, mode=mode)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = [chunker.chunk_text(text) for text in texts]
+            best = min(best, time.perf_counter() - start)
+        outputs[mode] = chunks
+        print(f"{mode:<14} {total_mb:>8.2f} {best:>8.3f} {total_mb / best:>8.2f} {sum(len(c) for c in chunks):>8}")
+
+    reference = outputs[CHUNKER_MODES[0]]
+    for mode, chunks in outputs.items():
+        status = 'identical' if chunks == reference else 'DIFFERENT'
+        print(f"{mode}: {status} to {CHUNKER_MODES[0]}")
+
+if __name__ == "__main__":
+    main()
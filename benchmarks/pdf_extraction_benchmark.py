@@ -0,0 +1,68 @@
+import os
+import sys
+import glob
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.src.document_processing.pdf_formatter import PDF_BACKENDS, get_backend
+
+BASELINE_BACKEND = 'pdfplumber'
+
+def char_similarity(reference: str, candidate: str) -> float:
+    if not reference and not candidate:
+        return 1.0
+    return SequenceMatcher(None, reference, candidate, autojunk=False).ratio()
+
+def run_backend(name: str, paths: List[str]) -> Dict:
+    backend = get_backend(name)
+    pages: Dict[str, List[str]] = {}
+    start = time.perf_counter()
+    for path in paths:
+        pages[path] = backend.extract_pages(path)
+    elapsed = time.perf_counter() - start
+    return {'pages': pages, 'seconds': elapsed, 'page_count': sum(len(p) for p in pages.values())}
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/pdf_extraction_benchmark.py <pdf-file-or-directory> [...]")
+        return
+
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            paths.extend(sorted(glob.glob(os.path.join(arg, '**', '*.pdf'), recursive=True)))
+        else:
+            paths.append(arg)
+
+    if not paths:
+        print("No PDF files found")
+        return
+
+    results = {}
+    for name in PDF_BACKENDS:
+        try:
+            results[name] = run_backend(name, paths)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+
+    baseline = results.get(BASELINE_BACKEND)
+    print(f"{'backend':<12} {'pages':>7} {'seconds':>9} {'pages/s':>9} {'char sim':>9} {'char delta':>11}")
+    for name, result in results.items():
+        pages_per_second = result['page_count'] / result['seconds'] if result['seconds'] else 0.0
+
+        similarities = []
+        char_delta = 0
+        if baseline is not None:
+            for path, pages in result['pages'].items():
+                for reference, candidate in zip(baseline['pages'][path], pages):
+                    similarities.append(char_similarity(reference, candidate))
+                    char_delta += len(candidate) - len(reference)
+        similarity = sum(similarities) / len(similarities) if similarities else 0.0
+
+        print(f"{name:<12} {result['page_count']:>7} {result['seconds']:>9.2f} {pages_per_second:>9.1f} {similarity:>9.3f} {char_delta:>+11}")
+
+if __name__ == "__main__":
+    main()
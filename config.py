@@ -3,12 +3,19 @@ import glob
 from dataclasses import dataclass, field
 from typing import List
 
+MULTI_WORKER_ERROR = (
+    "WORKERS > 1 requires sticky routing: session history, the LLM concurrency cap, the answer and "
+    "search caches and /api/reset are per worker. Workers listen on PORT..PORT+WORKERS-1; put a proxy in "
+    "front that pins each X-Session-ID header / session_id cookie to one of them, then set STICKY_SESSIONS=true."
+)
+
 @dataclass
 class AppConfig:
     embeddings_url: str = os.getenv('EMBEDDINGS_URL', 'http://127.0.0.1:1234/v1/embeddings')
     completions_url: str = os.getenv('COMPLETIONS_URL', 'http://127.0.0.1:1234/v1/chat/completions')
     cache_file: str = os.getenv('CACHE_FILE', 'cache.json')
     documents_directory: str = os.getenv('DOCUMENTS_DIRECTORY', 'documents')
+    pdf_backend: str = os.getenv('PDF_BACKEND', 'auto')
     document_paths: List[str] = field(init=False)
     embedding_model_id: str = os.getenv('EMBEDDING_MODEL_ID', 'text-embedding-qwen3-embedding-4b')
     completion_model_id: str = os.getenv('COMPLETION_MODEL_ID', 'llama-3.2-3b-instruct')
@@ -18,8 +25,36 @@ class AppConfig:
     max_history_length: int = int(os.getenv('MAX_HISTORY_LENGTH', '6'))
     max_tokens: int = int(os.getenv('MAX_TOKENS', '1024'))
     temperature: float = float(os.getenv('TEMPERATURE', '0.4'))
+    model_context_length: int = int(os.getenv('MODEL_CONTEXT_LENGTH', '8192'))
+    max_context_tokens: int = int(os.getenv('MAX_CONTEXT_TOKENS', '3000'))
+    # Per worker: each process runs its own scheduler, so the backend sees up to workers x this
+    llm_max_concurrency: int = int(os.getenv('LLM_MAX_CONCURRENCY', '1'))
+    search_cache_size: int = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+    answer_cache_size: int = int(os.getenv('ANSWER_CACHE_SIZE', '256'))
+    answer_cache_threshold: float = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+    max_sessions: int = int(os.getenv('MAX_SESSIONS', '1000'))
+    session_ttl_seconds: float = float(os.getenv('SESSION_TTL_SECONDS', '3600'))
+    max_history_tokens: int = int(os.getenv('MAX_HISTORY_TOKENS', '2048'))
+    history_summary_mode: bool = os.getenv('HISTORY_SUMMARY_MODE', 'false').lower() in ('1', 'true', 'yes')
+    workers: int = int(os.getenv('WORKERS', '1'))
+    # Sessions, the LLM cap, answer and search caches and /api/reset live in each worker's memory,
+    # so several workers need a proxy that pins every session to one of them
+    sticky_sessions: bool = os.getenv('STICKY_SESSIONS', 'false').lower() in ('1', 'true', 'yes')
+    shared_index_dir: str = os.getenv('SHARED_INDEX_DIR', '')
+    ingest_max_concurrency: int = int(os.getenv('INGEST_MAX_CONCURRENCY', '2'))
+    watch_documents: bool = os.getenv('WATCH_DOCUMENTS', 'true').lower() in ('1', 'true', 'yes')
+    watch_poll_interval: float = float(os.getenv('WATCH_POLL_INTERVAL', '5'))
+    compaction_dead_fraction: float = float(os.getenv('COMPACTION_DEAD_FRACTION', '0.2'))
+    collections_directory: str = os.getenv('COLLECTIONS_DIRECTORY', 'collections')
+    collection_memory_budget_mb: int = int(os.getenv('COLLECTION_MEMORY_BUDGET_MB', '2048'))
+    fast_startup: bool = os.getenv('FAST_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+    verify_document_hashes: bool = os.getenv('VERIFY_DOCUMENT_HASHES', 'false').lower() in ('1', 'true', 'yes')
     
     def __post_init__(self):
+        if self.workers > 1 and not self.sticky_sessions:
+            raise ValueError(MULTI_WORKER_ERROR)
+        if not self.shared_index_dir:
+            self.shared_index_dir = self.cache_file + '.shared'
         self.document_paths = self._discover_documents()
     
     def _discover_documents(self) -> List[str]:
@@ -4,6 +4,8 @@ DEFAULT_CHUNK_SIZE: Final[int] = 512
 DEFAULT_OVERLAP: Final[int] = 64
 HASH_CHUNK_SIZE: Final[int] = 8192
 CACHE_VERSION: Final[str] = "1.2"
+# Model ID recorded for an untagged cache whose dimension doesn't match the configured model
+UNKNOWN_EMBEDDING_MODEL: Final[str] = "unknown"
 MAX_RETRY_ATTEMPTS: Final[int] = 3
 MIN_REQUEST_INTERVAL: Final[float] = 1.0
 DEFAULT_TIMEOUT: Final[int] = 100
@@ -13,4 +15,43 @@ TEMPERATURE: Final[float] = 0.5
 SEARCH_K: Final[int] = 30
 SIMILARITY_THRESHOLD_HIGH: Final[float] = 0.85
 SIMILARITY_THRESHOLD_MEDIUM: Final[float] = 0.70
-SIMILARITY_THRESHOLD_LOW: Final[float] = 0.10
\ No newline at end of file
+SIMILARITY_THRESHOLD_LOW: Final[float] = 0.10
+DEFAULT_PDF_BACKEND: Final[str] = "auto"
+MIN_PAGE_TEXT_CHARS: Final[int] = 20
+MIN_PAGE_TEXT_QUALITY: Final[float] = 0.85
+CHECKPOINT_INTERVAL_BATCHES: Final[int] = 10
+CHUNKER_MODES: Final[tuple] = ("sentence", "token_offsets")
+DEFAULT_CHUNKER_MODE: Final[str] = "token_offsets"
+DEFAULT_SESSION_ID: Final[str] = "default"
+MAX_SESSIONS: Final[int] = 1000
+SESSION_TTL_SECONDS: Final[float] = 3600.0
+MAX_SESSION_CHARS: Final[int] = 100_000
+MAX_TOTAL_SESSION_CHARS: Final[int] = 50_000_000
+LLM_MAX_CONNECTIONS: Final[int] = 100
+LLM_MAX_CONCURRENCY: Final[int] = 1  # per worker process
+ANSWER_CACHE_SIZE: Final[int] = 256
+ANSWER_CACHE_THRESHOLD: Final[float] = 0.95
+SEARCH_CACHE_SIZE: Final[int] = 1024
+MODEL_CONTEXT_LENGTH: Final[int] = 8192
+MAX_CONTEXT_TOKENS: Final[int] = 3000
+MAX_EXCERPT_TOKENS: Final[int] = 175
+MAX_CONTEXT_CHUNKS: Final[int] = 12
+MESSAGE_OVERHEAD_TOKENS: Final[int] = 4
+CONTEXT_SAFETY_MARGIN_TOKENS: Final[int] = 256
+MAX_HISTORY_TOKENS: Final[int] = 2048
+HISTORY_SUMMARY_MAX_CHARS: Final[int] = 2000
+QUERY_EMBEDDING_BATCH: Final[int] = 32
+SEARCH_MAX_BATCH: Final[int] = 256
+SEARCH_MAX_K: Final[int] = 200
+EXTRACT_PAGE_BATCH: Final[int] = 8
+INGEST_MAX_CONCURRENCY: Final[int] = 2
+INGEST_MAX_PENDING: Final[int] = 64
+INGEST_JOB_HISTORY: Final[int] = 200
+INGEST_MAX_UPLOAD_BYTES: Final[int] = 256 * 1024 * 1024
+WATCH_DEBOUNCE_SECONDS: Final[float] = 2.0
+WATCH_POLL_INTERVAL: Final[float] = 5.0
+COMPACTION_DEAD_FRACTION: Final[float] = 0.2
+COMPACTION_INTERVAL_SECONDS: Final[float] = 30.0
+DEFAULT_COLLECTION: Final[str] = "default"
+COLLECTION_DOCUMENTS_DIRECTORY: Final[str] = "documents"
+COLLECTION_CACHE_FILE: Final[str] = "cache.json"
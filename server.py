@@ -1,16 +1,32 @@
-from typing import Generator
-from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager, suppress
 import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
 import threading
 import time
+import uuid
 
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, Response
 import uvicorn
 
-from config import AppConfig
-from app.main import initialize_components
+from config import MULTI_WORKER_ERROR, AppConfig
+from constants import INGEST_MAX_UPLOAD_BYTES, SEARCH_K, SEARCH_MAX_BATCH, SEARCH_MAX_K, SIMILARITY_THRESHOLD_LOW
+from app.main import (
+    check_connectivity, create_components, default_collection, initialize_components, load_collection,
+    log_configuration, open_collection, process_documents
+)
+from app.src.document_processing.ingest_queue import (
+    UPLOAD_DIRECTORY, IngestQueueClosed, IngestQueueFull, resolve_document_path, store_upload
+)
+from app.src.vector.collection_manager import CollectionManager, LoadedCollection, UnknownCollection
 from app.src.utils.logging_manager import LoggingManager
+from app.src.utils.latency import RATE_BUCKETS
+from app.src.utils.metrics import COUNT_BUCKETS, CONTENT_TYPE, PrometheusWriter, RequestMetrics, RequestMetricsMiddleware
 logger = LoggingManager()
 
 # Global flag to track initialization status
@@ -18,13 +34,53 @@ INITIALIZED = False
 INITIALIZATION_STARTED = False
 INITIALIZATION_PROGRESS = 0
 INITIALIZATION_MESSAGE = "Starting up..."
+STARTUP_STARTED = time.monotonic()
+STARTUP_PHASES: Dict[str, Dict[str, Any]] = {}
+
+def run_startup_phase(name: str, func: Callable, *args):
+    """Runs one startup phase, recording its status and duration for /api/health"""
+    STARTUP_PHASES[name] = {"status": "running"}
+    start = time.monotonic()
+    try:
+        result = func(*args)
+    except BaseException as e:
+        STARTUP_PHASES[name] = {"status": "failed", "seconds": round(time.monotonic() - start, 4), "error": str(e)}
+        raise
+    STARTUP_PHASES[name] = {"status": "done", "seconds": round(time.monotonic() - start, 4)}
+    return result
+
+def run_background_phase(name: str, func: Callable, *args) -> None:
+    # Failures only degrade the server; retrieval from the loaded index keeps working
+    try:
+        run_startup_phase(name, func, *args)
+    except BaseException as e:
+        logger.log_error(f"Startup phase '{name}' failed: {str(e)}")
+
+def publish_components(config: AppConfig, embedding_generator, vector_manager, chat) -> None:
+    global INITIALIZED, INITIALIZATION_PROGRESS, INITIALIZATION_MESSAGE
+    app.state.config = config
+    app.state.vector_manager = vector_manager
+    app.state.chat = chat
+    app.state.collections = CollectionManager(
+        config.collections_directory,
+        load=lambda collection: load_collection(config, collection, embedding_generator, logger),
+        memory_budget=config.collection_memory_budget_mb * 1024 * 1024,
+        default=open_collection(config, default_collection(config), vector_manager, logger),
+        logger=logger
+    )
+    INITIALIZED = True
+    INITIALIZATION_PROGRESS = 100
+    INITIALIZATION_MESSAGE = "System is ready"
+    STARTUP_PHASES["ready"] = {"status": "done", "seconds": round(time.monotonic() - STARTUP_STARTED, 4)}
+    logger.log_info(f"Server ready after {STARTUP_PHASES['ready']['seconds']}s")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global INITIALIZED, INITIALIZATION_STARTED, INITIALIZATION_PROGRESS, INITIALIZATION_MESSAGE
+    global INITIALIZED, INITIALIZATION_STARTED, INITIALIZATION_PROGRESS, INITIALIZATION_MESSAGE, STARTUP_STARTED
     
     # Startup - start initialization in background thread
     INITIALIZATION_STARTED = True
+    STARTUP_STARTED = time.monotonic()
     logger.log_info("Starting initialization in background thread...")
     
     def initialize_in_background():
@@ -33,37 +89,28 @@ async def lifespan(app: FastAPI):
         try:
             INITIALIZATION_MESSAGE = "Loading configuration..."
             INITIALIZATION_PROGRESS = 10
-            time.sleep(0.5)  # Simulate some work
+            config = run_startup_phase("config", AppConfig)
             
-            INITIALIZATION_MESSAGE = "Initializing components..."
-            INITIALIZATION_PROGRESS = 20
-            config = AppConfig()
+            if not config.fast_startup:
+                INITIALIZATION_MESSAGE = "Initializing components..."
+                INITIALIZATION_PROGRESS = 30
+                embedding_generator, vector_manager, chat = run_startup_phase("initialize", initialize_components, config)
+                publish_components(config, embedding_generator, vector_manager, chat)
+                return
             
+            # Serve retrieval from the persisted index first; network checks and new documents follow
             INITIALIZATION_MESSAGE = "Loading vector cache..."
             INITIALIZATION_PROGRESS = 30
-            _, vector_manager, chat = initialize_components(config)
-            
-            # Store components in app state
-            app.state.vector_manager = vector_manager
-            app.state.chat = chat
-            
-            INITIALIZATION_MESSAGE = "Building search index..."
-            INITIALIZATION_PROGRESS = 70
-            # Force index building by doing a simple search
-            try:
-                vector_manager.search("test")
-            except Exception as e:
-                logger.log_error(f"Index building test failed: {str(e)}")
-            
-            INITIALIZATION_MESSAGE = "Finalizing..."
-            INITIALIZATION_PROGRESS = 90
-            time.sleep(0.5)  # Simulate finalization
+            log_configuration(config, logger)
+            embedding_generator, vector_manager, chat = run_startup_phase("load_index", create_components, config, logger)
+            publish_components(config, embedding_generator, vector_manager, chat)
             
-            INITIALIZED = True
-            INITIALIZATION_PROGRESS = 100
-            logger.log_info("Background initialization completed successfully!")
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup") as pool:
+                pool.submit(run_background_phase, "connectivity", check_connectivity, config, embedding_generator, logger)
+                pool.submit(run_background_phase, "document_scan", process_documents, config, vector_manager, logger)
+            logger.log_info(f"Background startup phases finished: {STARTUP_PHASES}")
             
-        except Exception as e:
+        except BaseException as e:
             logger.log_error(f"Background initialization failed: {str(e)}")
             INITIALIZATION_MESSAGE = f"Initialization failed: {str(e)}"
     
@@ -75,13 +122,75 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     if INITIALIZED:
-        logger.log_info("Saving vector cache...")
-        app.state.vector_manager.close()
+        await app.state.chat.llm_client.aclose()
+        # Running ingestion jobs stop at their next batch; what they embedded is checkpointed
+        logger.log_info("Saving vector caches...")
+        app.state.collections.close()
         stats = app.state.vector_manager.get_stats()
         logger.log_info(f"Final cache: {stats['documents']} docs, {stats['chunks']} chunks")
 
 
 app = FastAPI(lifespan=lifespan)
+request_metrics = RequestMetrics()
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
+SESSION_COOKIE = "session_id"
+SESSION_HEADER = "X-Session-ID"
+COLLECTION_HEADER = "X-Collection"
+SEARCH_STREAM_SLICE = 32
+
+def get_session_id(request: Request) -> Tuple[str, bool]:
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        return session_id[:128], False
+    return uuid.uuid4().hex, True
+
+async def get_collection(request: Request, data: Optional[dict] = None) -> LoadedCollection:
+    """Collection named by the body, ?collection= or X-Collection; the default one otherwise.
+
+    A cold collection is loaded from its cache in a worker thread, so the event loop keeps serving.
+    """
+    name = (data or {}).get("collection") or request.query_params.get("collection") or request.headers.get(COLLECTION_HEADER)
+    if name is not None and not isinstance(name, str):
+        raise UnknownCollection(str(name))
+    return await asyncio.to_thread(request.app.state.collections.get, name)
+
+def unknown_collection(e: UnknownCollection) -> JSONResponse:
+    return JSONResponse({"error": f"Unknown collection: {e.args[0]}"}, status_code=404)
+
+async def wait_for_disconnect(request: Request) -> None:
+    # The body has already been read, so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def stream_until_disconnect(request: Request, stream: AsyncGenerator[str, None]) -> AsyncGenerator[bytes, None]:
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request))
+    next_chunk = None
+    request_metrics.active_streams += 1
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({next_chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                logger.log_info("Client disconnected, cancelling generation")
+                return
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                return
+            if chunk:
+                yield chunk.encode("utf-8")
+    finally:
+        request_metrics.active_streams -= 1
+        disconnected.cancel()
+        if next_chunk is not None and not next_chunk.done():
+            # Cancelling the pending read propagates into Chat.astream_chat and closes the upstream request
+            next_chunk.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await next_chunk
+        await stream.aclose()
 
 @app.get("/", response_class=HTMLResponse)
 def root_page() -> str:
@@ -248,6 +357,13 @@ def root_page() -> str:
       const initStatus = document.getElementById('initStatus');
       const initMessage = document.getElementById('initMessage');
 
+      // One conversation per tab: sessionStorage is scoped to the tab
+      let sessionId = sessionStorage.getItem('veritasSessionId');
+      if (!sessionId) {
+        sessionId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+        sessionStorage.setItem('veritasSessionId', sessionId);
+      }
+
       // Check initialization status
       let initializationCheckInterval;
       let lastProgress = 0;
@@ -347,7 +463,7 @@ def root_page() -> str:
         
         // Clear backend chat history
         try {
-          await fetch('/api/reset', { method: 'POST' });
+          await fetch('/api/reset', { method: 'POST', headers: { 'X-Session-ID': sessionId } });
           console.log('Chat history cleared');
         } catch (err) {
           console.error('Failed to clear chat history:', err);
@@ -369,7 +485,7 @@ def root_page() -> str:
         try {
           const resp = await fetch('/api/chat', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Session-ID': sessionId },
             body: JSON.stringify({ message: text })
           });
           console.log('Response status:', resp.status);
@@ -419,18 +535,33 @@ async def health_check():
     global INITIALIZED, INITIALIZATION_STARTED, INITIALIZATION_PROGRESS, INITIALIZATION_MESSAGE
     
     if INITIALIZED:
+        default = app.state.collections.get()
         return {
             "initialized": True, 
             "started": True, 
             "message": "System is ready",
-            "progress": 100
+            "progress": 100,
+            "startup": STARTUP_PHASES,
+            "llm_queue": app.state.chat.scheduler.get_stats(),
+            "generation": app.state.chat.get_generation_stats(),
+            "answer_cache": app.state.chat.answer_cache.get_stats(),
+            "ingest": default.ingest_queue.get_stats() if default.ingest_queue else None,
+            "document_watcher": default.document_watcher.get_stats() if default.document_watcher else None,
+            "compaction": default.compaction.get_stats() if default.compaction else None,
+            "reembedding": default.reembedding.get_stats() if default.reembedding else None,
+            "collections": app.state.collections.get_stats(),
+            "latency": {
+                "chat": app.state.chat.get_latency_stats(),
+                "retrieval": app.state.chat.vector_manager.latency.get_stats()
+            }
         }
     elif INITIALIZATION_STARTED:
         return {
             "initialized": False, 
             "started": True, 
             "message": INITIALIZATION_MESSAGE,
-            "progress": INITIALIZATION_PROGRESS
+            "progress": INITIALIZATION_PROGRESS,
+            "startup": STARTUP_PHASES
         }
     else:
         return {
@@ -440,6 +571,338 @@ async def health_check():
             "progress": 0
         }
 
+@app.get("/api/metrics")
+async def metrics():
+    """Prometheus scrape endpoint; everything is read from in-process counters"""
+    writer = PrometheusWriter()
+    request_metrics.write(writer)
+    writer.gauge("rag_initialized", "1 once the system is ready to answer.", [({}, int(INITIALIZED))])
+    if INITIALIZED:
+        write_component_metrics(writer, app.state.chat)
+        loaded = app.state.collections.loaded()
+        writer.gauge("rag_ingest_jobs", "Ingestion jobs by status.", (
+            ({"collection": c.collection.name, "status": status}, count)
+            for c in loaded if c.ingest_queue is not None
+            for status, count in c.ingest_queue.get_stats().items()
+        ))
+        writer.gauge("rag_collection_bytes", "Resident memory of each loaded collection.", (
+            ({"collection": c.collection.name}, c.vector_manager.memory_bytes()) for c in loaded
+        ))
+        writer.gauge("rag_reembedding_chunks", "Chunks re-embedded with the configured model, and the total.", (
+            ({"collection": c.collection.name, "state": state}, count)
+            for c in loaded if c.reembedding is not None
+            for state, count in c.reembedding.get_stats()["chunks"].items()
+        ))
+        writer.counter("rag_collection_evictions_total", "Collections evicted to stay within the memory budget.", [
+            ({}, app.state.collections.evictions)
+        ])
+    return Response(writer.render(), media_type=CONTENT_TYPE)
+
+def write_component_metrics(writer: PrometheusWriter, chat) -> None:
+    vector_manager = chat.vector_manager
+    embedding_generator = vector_manager.embedding_generator
+    stats = vector_manager.get_stats()
+
+    writer.histogram(
+        "rag_embedding_request_seconds", "Embedding API call latency.",
+        [({}, embedding_generator.latency.histogram("request"))]
+    )
+    writer.histogram(
+        "rag_embedding_batch_size", "Texts per embedding API call.",
+        [({}, embedding_generator.latency.histogram("batch_size", COUNT_BUCKETS))]
+    )
+    writer.recorder("rag_retrieval_seconds", "Query embedding and vector search latency.", vector_manager.latency, "stage")
+    writer.recorder(
+        "rag_chat_stage_seconds", "Per-stage chat request latency.",
+        chat.latency, "stage", include=lambda name: name != "tokens_per_second"
+    )
+    writer.histogram(
+        "rag_llm_tokens_per_second", "LLM decode throughput per generation.",
+        [({}, chat.latency.histogram("tokens_per_second", RATE_BUCKETS))]
+    )
+
+    caches = {
+        "search": stats["search_cache"],
+        "query_embedding": stats["query_embedding_cache"],
+        "answer": chat.answer_cache.get_stats()
+    }
+    writer.counter("rag_cache_hits_total", "Cache hits.", (({"cache": name}, c["hits"]) for name, c in caches.items()))
+    writer.counter("rag_cache_misses_total", "Cache misses.", (({"cache": name}, c["misses"]) for name, c in caches.items()))
+    writer.gauge("rag_cache_hit_ratio", "Cache hit ratio since startup.", (({"cache": name}, c["hit_ratio"]) for name, c in caches.items()))
+
+    writer.gauge("rag_index_rows", "Embedded chunks in the index.", [({}, stats["embeddings"])])
+    writer.gauge("rag_index_tombstones", "Deleted rows awaiting compaction.", [({}, stats["tombstones"])])
+    writer.gauge("rag_index_bytes", "In-memory size of the normalized index matrix.", [({}, stats["index_bytes"])])
+    writer.gauge("rag_cache_file_bytes", "Size of the persisted vector cache.", [({}, stats["cache_file_bytes"])])
+    writer.gauge("rag_documents", "Indexed documents.", [({}, stats["documents"])])
+
+    queue = chat.scheduler.get_stats()
+    writer.gauge("rag_llm_active_generations", "Generations holding a scheduler slot.", [({}, queue["active"])])
+    writer.gauge("rag_llm_queue_depth", "Generations waiting for a slot.", [({}, queue["queue_depth"])])
+    generation = chat.get_generation_stats()
+    writer.counter("rag_llm_cancelled_generations_total", "Generations cancelled by client disconnect.", [({}, generation["cancelled_generations"])])
+
+def parse_search_request(data: dict) -> Tuple[List[str], dict]:
+    """Validates a /api/search body; raises ValueError with a client-facing message"""
+    if "queries" in data:
+        queries = data["queries"]
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise ValueError("'queries' must be a list of strings")
+    elif isinstance(data.get("query"), str):
+        queries = [data["query"]]
+    else:
+        raise ValueError("Provide 'query' or 'queries'")
+    if not queries or len(queries) > SEARCH_MAX_BATCH:
+        raise ValueError(f"Between 1 and {SEARCH_MAX_BATCH} queries are allowed")
+
+    sources = data.get("sources")
+    if sources is not None and (not isinstance(sources, list) or not all(isinstance(s, str) for s in sources)):
+        raise ValueError("'sources' must be a list of file paths or names")
+    mode = data.get("mode", "vector")
+    if mode not in ("vector", "lexical", "auto"):
+        raise ValueError("'mode' must be 'vector', 'lexical' or 'auto'")
+    try:
+        k = int(data.get("k", SEARCH_K))
+        min_similarity = float(data.get("min_similarity", SIMILARITY_THRESHOLD_LOW))
+    except (TypeError, ValueError):
+        raise ValueError("'k' must be an integer and 'min_similarity' a number")
+    if not 1 <= k <= SEARCH_MAX_K:
+        raise ValueError(f"'k' must be between 1 and {SEARCH_MAX_K}")
+    return queries, {"k": k, "min_similarity": min_similarity, "sources": sources or None, "mode": mode}
+
+def run_search(vector_manager, queries: List[str], k: int, min_similarity: float, sources, mode: str) -> List[list]:
+    if mode == "lexical":
+        results = [vector_manager.search_lexical(q, k=k, sources=sources) for q in queries]
+    else:
+        results = vector_manager.search_batch(queries, k=k, min_similarity=min_similarity, sources=sources)
+        if mode == "auto":
+            results = [r or vector_manager.search_lexical(q, k=k, sources=sources) for q, r in zip(queries, results)]
+    return results
+
+def format_search_result(position: int, query: str, hits: list) -> dict:
+    return {
+        "index": position,
+        "query": query,
+        "hits": [
+            {"rank": rank, "score": round(float(score), 4), "source": source, "chunk_idx": chunk_idx, "text": text}
+            for rank, (text, score, source, chunk_idx) in enumerate(hits, start=1)
+        ]
+    }
+
+@app.post("/api/search")
+async def api_search(request: Request):
+    """Retrieval without generation; NDJSON (one line per query) when requested or for large batches"""
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+
+    try:
+        data = await request.json()
+        queries, options = parse_search_request(data if isinstance(data, dict) else {})
+        collection = await get_collection(request, data)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+
+    vector_manager = collection.vector_manager
+    stream = bool(data.get("stream")) or "application/x-ndjson" in request.headers.get("accept", "")
+    if not stream:
+        results = await asyncio.to_thread(run_search, vector_manager, queries, **options)
+        return {"results": [format_search_result(i, q, hits) for i, (q, hits) in enumerate(zip(queries, results))]}
+
+    async def ndjson_lines() -> AsyncGenerator[bytes, None]:
+        # Slices keep the first lines flowing while later queries are still being scored
+        for start in range(0, len(queries), SEARCH_STREAM_SLICE):
+            batch = queries[start:start + SEARCH_STREAM_SLICE]
+            results = await asyncio.to_thread(run_search, vector_manager, batch, **options)
+            for offset, (query, hits) in enumerate(zip(batch, results)):
+                yield (json.dumps(format_search_result(start + offset, query, hits)) + "\n").encode("utf-8")
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+async def receive_upload(request: Request, directory: str) -> Tuple[str, str]:
+    """Streams a PDF request body to a temporary file next to its destination; returns the path and SHA-256"""
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > INGEST_MAX_UPLOAD_BYTES:
+                    raise ValueError(f"Uploads are limited to {INGEST_MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+                if size == len(chunk) and not chunk.startswith(b"%PDF-"):
+                    raise ValueError("The request body is not a PDF")
+                hasher.update(chunk)
+                f.write(chunk)
+        if not size:
+            raise ValueError("Empty upload")
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest()
+
+@app.post("/api/ingest")
+async def api_ingest(request: Request):
+    """Queues a PDF for background ingestion: a JSON {"path"} under the documents directory,
+    or the raw PDF as the request body with ?filename=... Read-only workers forward it to the writer."""
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    is_json = request.headers.get("content-type", "").startswith("application/json")
+    try:
+        data = await request.json() if is_json else None
+        collection = await get_collection(request, data if isinstance(data, dict) else None)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+    documents_directory = collection.collection.documents_directory
+    ingest_queue = collection.ingest_queue
+    # A read-only worker has no queue; it hands the request to the writer through the spool
+    spool = collection.ingest_spool if ingest_queue is None else None
+    if ingest_queue is None and spool is None:
+        return JSONResponse({"error": "This worker serves a read-only index; retry against the writer process"}, status_code=409)
+
+    def submit(path: str, file_hash: Optional[str] = None):
+        return spool.forward(path, file_hash) if spool is not None else ingest_queue.submit(path, file_hash)
+
+    try:
+        if is_json:
+            path = data.get("path") if isinstance(data, dict) else None
+            if not isinstance(path, str) or not path:
+                raise ValueError("Provide 'path' relative to the documents directory")
+            path = resolve_document_path(documents_directory, path)
+            result = await asyncio.to_thread(submit, path)
+        else:
+            upload_directory = os.path.join(documents_directory, UPLOAD_DIRECTORY)
+            temp_path, file_hash = await receive_upload(request, upload_directory)
+            job = ingest_queue.find(file_hash) if ingest_queue is not None else None
+            if job is not None:
+                os.remove(temp_path)
+                result = job, False
+            else:
+                try:
+                    # Refuse before the upload lands where the document watcher would ingest it anyway
+                    (spool or ingest_queue).check_capacity()
+                except IngestQueueFull:
+                    os.remove(temp_path)
+                    raise
+                filename = request.query_params.get("filename") or request.headers.get("x-filename", "")
+                path, stored = await asyncio.to_thread(store_upload, documents_directory, filename, temp_path, file_hash)
+                try:
+                    result = submit(path, file_hash)
+                except (IngestQueueFull, IngestQueueClosed):
+                    if stored:
+                        os.remove(path)
+                    raise
+    except FileNotFoundError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except IngestQueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    except IngestQueueClosed as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+    if spool is not None:
+        # Job progress is only visible on the writer, which picks the request up on its next poll
+        return JSONResponse(
+            {"forwarded": True, "request_id": result, "collection": collection.collection.name, "source": path},
+            status_code=202
+        )
+    job, created = result
+    return JSONResponse(
+        {"created": created, "collection": collection.collection.name, **job.to_dict()},
+        status_code=202 if created else 200
+    )
+
+@app.get("/api/ingest")
+async def api_ingest_jobs(request: Request):
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    try:
+        collection = await get_collection(request)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+    ingest_queue = collection.ingest_queue
+    if ingest_queue is None:
+        return {"collection": collection.collection.name, "stats": {}, "jobs": []}
+    return {"collection": collection.collection.name, "stats": ingest_queue.get_stats(), "jobs": ingest_queue.list_jobs()}
+
+@app.get("/api/ingest/{job_id}")
+async def api_ingest_job(request: Request, job_id: str):
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    try:
+        collection = await get_collection(request)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+    job = collection.ingest_queue.get(job_id) if collection.ingest_queue else None
+    if job is None:
+        return JSONResponse({"error": f"Unknown ingestion job: {job_id}"}, status_code=404)
+    return job.to_dict()
+
+def reembedding_status(collection: LoadedCollection) -> dict:
+    stats = collection.reembedding.get_stats() if collection.reembedding else {"status": "idle"}
+    return {"collection": collection.collection.name, "embedding_model": collection.vector_manager.get_stats()["embedding_model"], **stats}
+
+@app.get("/api/reembedding")
+async def api_reembedding(request: Request):
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    try:
+        collection = await get_collection(request)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+    return reembedding_status(collection)
+
+@app.post("/api/reembedding")
+async def api_reembedding_resume(request: Request):
+    """Resumes a failed or cancelled re-embedding from its checkpoint"""
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    try:
+        collection = await get_collection(request)
+    except UnknownCollection as e:
+        return unknown_collection(e)
+    if collection.vector_manager.read_only:
+        return JSONResponse({"error": "This worker serves a read-only index; retry against the writer process"}, status_code=409)
+    if collection.reembedding is None or not collection.vector_manager.needs_reembedding():
+        return JSONResponse({"error": "The index already uses the configured embedding model"}, status_code=409)
+    collection.reembedding.start()
+    return JSONResponse(reembedding_status(collection), status_code=202)
+
+@app.get("/api/collections")
+async def api_collections(request: Request):
+    if not INITIALIZED:
+        return JSONResponse(
+            {"error": "System not initialized yet. Please wait."},
+            status_code=503
+        )
+    return request.app.state.collections.get_stats()
+
 @app.post("/api/chat")
 async def api_chat(request: Request):
     if not INITIALIZED:
@@ -450,15 +913,21 @@ async def api_chat(request: Request):
     
     data = await request.json()
     user_message = (data.get("message") or "").strip()
+    session_id, is_new_session = get_session_id(request)
     if not user_message:
         return StreamingResponse((chunk for chunk in []), media_type="text/plain")
+    try:
+        collection = await get_collection(request, data)
+    except UnknownCollection as e:
+        return unknown_collection(e)
 
-    def streamer() -> Generator[bytes, None, None]:
-        for chunk in request.app.state.chat.stream_chat(user_message):
-            if chunk:
-                yield chunk.encode("utf-8")
-
-    return StreamingResponse(streamer(), media_type="text/plain")
+    stream = request.app.state.chat.astream_chat(
+        user_message, session_id=session_id, vector_manager=collection.vector_manager
+    )
+    response = StreamingResponse(stream_until_disconnect(request, stream), media_type="text/plain")
+    if is_new_session:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="strict")
+    return response
 
 @app.post("/api/reset")
 async def api_reset(request: Request):
@@ -468,11 +937,42 @@ async def api_reset(request: Request):
             status_code=503
         )
     
-    request.app.state.chat.conversation_history = [{
-        'role': 'system',
-        'content': request.app.state.chat.config.system_message
-    }]
+    session_id, _ = get_session_id(request)
+    request.app.state.chat.reset(session_id)
     return {"status": "reset"}
 
+def serve(port: int) -> None:
+    uvicorn.run(app, host="127.0.0.1", port=port)
+
+def serve_instances(workers: int, base_port: int) -> None:
+    """Runs one server process per port, from base_port to base_port + workers - 1."""
+    processes = [
+        multiprocessing.Process(target=serve, args=(base_port + i,), name=f"worker-{base_port + i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.log_info(f"Started {workers} workers on ports {base_port}-{base_port + workers - 1}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8888)
\ No newline at end of file
+    # Read directly: AppConfig() creates the documents directory and scans it
+    workers = int(os.getenv('WORKERS', '1'))
+    if workers > 1 and os.getenv('STICKY_SESSIONS', 'false').lower() not in ('1', 'true', 'yes'):
+        raise SystemExit(MULTI_WORKER_ERROR)
+    port = int(os.getenv('PORT', '8888'))
+    if workers > 1:
+        # Uvicorn's own workers share one socket and can't be pinned per session, so each worker is
+        # a separate instance on its own port; they elect one writer and share its memory-mapped index
+        serve_instances(workers, port)
+    else:
+        serve(port)